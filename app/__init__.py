@@ -25,13 +25,46 @@ api_errors = {"NotFound": {"message": "Route not found", "status": 404}}
 
 api.errors = api_errors
 
-from app.resources import RoutesAPI, RouteAPI, RouteCalculateCostAPI
+from app.resources import (
+    RoutesAPI,
+    RoutesImportAPI,
+    RouteAPI,
+    RouteCalculateCostAPI,
+    RouteCalculateCostCacheAPI,
+    RouteBatchCalculateCostAPI,
+    RouteCostMatrixAPI,
+    JobsAPI,
+    JobAPI,
+    JobResultAPI,
+    MetricsAPI,
+)
 
 api.add_resource(RoutesAPI, "/routes", endpoint="routes")
+api.add_resource(RoutesImportAPI, "/routes/import", endpoint="routes_import")
 api.add_resource(RouteAPI, "/routes/<int:pk>", endpoint="route")
 api.add_resource(
     RouteCalculateCostAPI, "/routes/calculate-cost", endpoint="route_calculate_cost"
 )
+api.add_resource(
+    RouteCalculateCostCacheAPI,
+    "/routes/calculate-cost/cache",
+    endpoint="route_calculate_cost_cache",
+)
+api.add_resource(
+    RouteBatchCalculateCostAPI,
+    "/routes/calculate-cost/batch",
+    endpoint="route_calculate_cost_batch",
+)
+api.add_resource(
+    RouteCostMatrixAPI,
+    "/routes/calculate-cost/matrix",
+    endpoint="route_calculate_cost_matrix",
+)
+
+api.add_resource(JobsAPI, "/jobs", endpoint="jobs")
+api.add_resource(JobAPI, "/jobs/<int:pk>", endpoint="job")
+api.add_resource(JobResultAPI, "/jobs/<int:pk>/result", endpoint="job_result")
+api.add_resource(MetricsAPI, "/metrics", endpoint="metrics")
 
 
 @app.route("/", methods=["GET"])
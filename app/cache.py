@@ -0,0 +1,352 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.dijkstra import Graph
+
+
+# revisions below the newest one applied that are still awaited, in case
+# their transaction commits late; older gaps are given up on
+GAP_WINDOW = 1000
+
+
+class RoutingGraph(object):
+    """Routing graph held in memory by each worker.
+
+    The graph is built lazily through ``loader``, which must return
+    ``(pk, origin_point, destination_point, distance)`` rows, and optionally
+    ``coordinates_loader``, returning ``(name, x, y)`` rows. Every write bumps
+    ``generation``. Writes patch a fresh graph in place; a graph left at an
+    older generation is stale and is rebuilt on the next :meth:`get`.
+
+    Writes made by other workers are pulled from a change feed when
+    ``revision_loader`` and ``changes_loader`` are given: the first returns
+    the newest revision, the second the ``(revision, action, pk, origin_point,
+    destination_point, distance)`` changes after a revision, in order. A
+    graph more than ``retention`` revisions behind is reloaded instead, as
+    the feed may no longer hold the changes it missed.
+    """
+
+    def __init__(
+        self,
+        loader,
+        coordinates_loader=None,
+        revision_loader=None,
+        changes_loader=None,
+        sync_interval=0,
+        retention=None,
+    ):
+        self.loader = loader
+        self.coordinates_loader = coordinates_loader
+        self.revision_loader = revision_loader
+        self.changes_loader = changes_loader
+        self.sync_interval = sync_interval
+        self.retention = retention
+        self.generation = 0
+        self.graph_generation = None
+        self.revision = 0
+        self._gaps = set()
+        self._synced = None
+        self._graph = None
+        self._lock = threading.RLock()
+
+    def is_stale(self):
+        return self._graph is None or self.graph_generation != self.generation
+
+    def get(self):
+        with self._lock:
+            self.sync()
+            if self.is_stale():
+                generation = self.generation
+                if self.revision_loader is not None:
+                    # read before the routes: changes committed in between
+                    # are replayed on top, which is harmless
+                    self.revision = self.revision_loader()
+                    self._gaps.clear()
+                    self._synced = time.monotonic()
+                self._graph = self.build(self.loader())
+                if self.coordinates_loader is not None:
+                    for name, x, y in self.coordinates_loader():
+                        self._graph.set_coordinates(name, x, y)
+                self.graph_generation = generation
+            return self._graph
+
+    def build(self, rows):
+        graph = Graph()
+
+        for pk, origin, destination, distance in rows:
+            graph.add_node(origin)
+            graph.add_edge(origin, destination, distance, pk)
+
+        return graph
+
+    def sync(self):
+        """Apply the changes after :attr:`revision`, polling the feed at
+        most every ``sync_interval`` seconds.
+
+        A ``"reload"`` change, written by bulk imports, marks the graph stale
+        instead. Revisions are numbered when written but may commit out of
+        order, so skipped numbers are looked for again on later polls.
+        """
+        with self._lock:
+            if self.changes_loader is None or self.is_stale():
+                return
+            now = time.monotonic()
+            if self._synced is not None and now - self._synced < self.sync_interval:
+                return
+            self._synced = now
+
+            since = min(self._gaps, default=self.revision + 1) - 1
+            changes = list(self.changes_loader(since))
+            if (
+                self.retention is not None
+                and changes
+                and changes[-1][0] - self.revision > self.retention
+            ):
+                # the revisions in between may be pruned
+                self.invalidate()
+                return
+
+            for change in changes:
+                revision, action, pk, origin, destination, distance = change
+                if revision <= self.revision:
+                    if revision not in self._gaps:
+                        continue
+                    self._gaps.discard(revision)
+                else:
+                    self._gaps.update(range(self.revision + 1, revision))
+                    self.revision = revision
+
+                if action == "reload":
+                    self.invalidate()
+                    return
+                elif action == "delete":
+                    self.remove_route(pk)
+                else:
+                    self.add_route(pk, origin, destination, distance)
+
+            self._gaps = {
+                revision
+                for revision in self._gaps
+                if revision > self.revision - GAP_WINDOW
+            }
+
+    def has_origin(self, point):
+        """Whether some route starts at ``point``, without a database query."""
+        return bool(self.get().edges.get(point))
+
+    def has_destination(self, point):
+        """Whether some route ends at ``point``, without a database query."""
+        return bool(self.get().reverse_edges.get(point))
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+
+    def patch(self, apply, revision=None):
+        """Apply ``apply(graph)`` to a fresh graph as part of a write.
+
+        ``revision`` is the change feed entry of a local write; the next
+        :meth:`sync` skips it when nothing else is pending before it.
+        """
+        with self._lock:
+            fresh = not self.is_stale()
+            self.generation += 1
+            if fresh:
+                apply(self._graph)
+                self.graph_generation = self.generation
+                if revision is not None and revision == self.revision + 1:
+                    self.revision = revision
+
+    def add_route(self, pk, origin, destination, distance, revision=None):
+        """Add route ``pk``, replacing any previous version of it."""
+
+        def apply(graph):
+            graph.add_node(origin)
+            graph.add_edge(origin, destination, distance, pk)
+
+        self.patch(apply, revision)
+
+    update_route = add_route
+
+    def remove_route(self, pk, revision=None):
+        def apply(graph):
+            if pk in graph.routes:
+                graph.remove_edge(pk)
+
+        self.patch(apply, revision)
+
+
+class BackgroundBuild(object):
+    """Value derived from the routing graph by ``builder``, rebuilt in a
+    background thread whenever the graph changes.
+
+    The thread works on a copy of the graph's ``distances``, so patches to
+    the live graph do not disturb it. Until the value for the current
+    generation is ready, :meth:`get` returns ``None``.
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.generation = None
+        self.value = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def get(self, graph, generation):
+        with self._lock:
+            if self.generation == generation:
+                return self.value
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._build,
+                    args=(graph.distances.copy(), generation),
+                    daemon=True,
+                )
+                self._thread.start()
+            return None
+
+    def _build(self, distances, generation):
+        value = self.builder(distances)
+        with self._lock:
+            self.value, self.generation = value, generation
+
+    def wait(self):
+        """Block until the current build, if any, is done."""
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+
+class PoolCache(object):
+    """Pool started by ``factory(distances)`` over a copy of the routing
+    graph's ``distances``, and replaced when the graph changes."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.generation = None
+        self.pool = None
+        self._lock = threading.Lock()
+
+    def get(self, graph, generation):
+        with self._lock:
+            if self.pool is None or self.generation != generation:
+                if self.pool is not None:
+                    # searches already submitted still run to completion
+                    self.pool.shutdown(wait=False)
+                self.pool = self.factory(graph.distances.copy())
+                self.generation = generation
+            return self.pool
+
+    def clear(self):
+        with self._lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+            self.pool = self.generation = None
+
+
+class PathCache(object):
+    """Bounded LRU cache of shortest-path results.
+
+    Keys should carry the graph version the result was computed on, so a
+    write makes older entries unreachable; they are evicted as new ones
+    come in. A ``maxsize`` of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class FileCache(object):
+    """Object loaded from a file through ``loader``, reloaded whenever the
+    file is replaced."""
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._key = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """The loaded object, or ``None`` when ``path`` does not exist."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key != self._key:
+                self._value = self.loader(path)
+                self._key = key
+            return self._value
+
+
+class PolledValue(object):
+    """Value of ``loader``, loaded again once ``interval`` seconds have
+    passed or whenever :meth:`get` is given a new ``key``."""
+
+    def __init__(self, loader, interval=0):
+        self.loader = loader
+        self.interval = interval
+        self._key = None
+        self._loaded = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self, key=None):
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._loaded is None
+                or key != self._key
+                or now - self._loaded >= self.interval
+            ):
+                self._value = self.loader()
+                self._key = key
+                self._loaded = now
+            return self._value
@@ -0,0 +1,137 @@
+import json
+
+from app.fields import float_field, integer_field, paths_field
+from app.metrics import metrics
+from app.models import (
+    Route,
+    calculate_costs,
+    calculate_distance_rows,
+    get_point_index,
+)
+from app.schema import Field, Schema
+
+# the calculation endpoints and the jobs running them share these; each
+# calculation takes the parsed arguments and returns ``(body, status)``
+cost_schema = Schema(
+    Field("origin_point", str, required=True),
+    Field("destination_point", str, required=True),
+    Field("autonomy", integer_field, required=True),
+    Field("fuel_price", float_field, required=True),
+    Field("k", paths_field),
+)
+
+batch_schema = Schema(Field("items", list, required=True))
+
+matrix_schema = Schema(
+    Field("origins", list, required=True),
+    Field("destinations", list, required=True),
+    Field("autonomy", integer_field, required=True),
+    Field("fuel_price", float_field, required=True),
+)
+
+
+def missing_point(points, origins, destinations):
+    """The error for the first of ``origins`` no route starts at in
+    ``points``, or else of ``destinations`` no route ends at; ``None`` when
+    all are known."""
+    for origin_point in origins:
+        if not points.has_origin(origin_point):
+            return "Origin point '%s' not found" % origin_point
+    for destination_point in destinations:
+        if not points.has_destination(destination_point):
+            return "Destination point '%s' not found" % destination_point
+    return None
+
+
+def calculate_cost(args):
+    origin_point = args.get("origin_point")
+    destination_point = args.get("destination_point")
+    autonomy = args.get("autonomy")
+    fuel_price = args.get("fuel_price")
+
+    # validate origin point and destination point
+    with metrics.span("validate"):
+        error = missing_point(get_point_index(), [origin_point], [destination_point])
+    if error is not None:
+        return {"error": error}, 400
+
+    k = args.get("k")
+    if k is not None:
+        paths = Route.calculate_alternatives(
+            origin_point, destination_point, autonomy, fuel_price, k
+        )
+        return {"paths": [{"cost": cost, "path": path} for cost, path in paths]}, 200
+
+    cost, path = Route.calculate(origin_point, destination_point, autonomy, fuel_price)
+    return {"cost": cost, "path": path}, 200
+
+
+def parse_batch_item(item):
+    if not isinstance(item, dict):
+        raise ValueError("Item '{}' is not a valid object.".format(item))
+
+    for name in ("origin_point", "destination_point", "autonomy", "fuel_price"):
+        if item.get(name) is None:
+            raise ValueError("Missing required parameter '{}'.".format(name))
+
+    return (
+        str(item["origin_point"]),
+        str(item["destination_point"]),
+        integer_field(item["autonomy"], "autonomy"),
+        float_field(item["fuel_price"], "fuel_price"),
+    )
+
+
+def calculate_cost_batch(args):
+    items, results = {}, {}
+    for index, item in enumerate(args.get("items")):
+        try:
+            items[index] = parse_batch_item(item)
+        except ValueError as e:
+            results[index] = {"error": str(e)}
+
+    # validate origin points and destination points
+    points = get_point_index()
+    for index, (origin_point, destination_point, _, _) in list(items.items()):
+        error = missing_point(points, [origin_point], [destination_point])
+        if error is not None:
+            results[index] = {"error": error}
+            del items[index]
+
+    calculated = Route.calculate_batch(list(items.values()))
+
+    for (index, item), result in zip(items.items(), calculated):
+        if result is None:
+            results[index] = {"error": "No route from '%s' to '%s'" % item[:2]}
+        else:
+            cost, path = result
+            results[index] = {"cost": cost, "path": path}
+
+    return {"results": [results[index] for index in sorted(results)]}, 200
+
+
+def calculate_cost_matrix(args):
+    """The body is an iterator of JSON text, one row of costs at a time,
+    unless the request is rejected."""
+    origins = [str(point) for point in args.get("origins")]
+    destinations = [str(point) for point in args.get("destinations")]
+    autonomy = args.get("autonomy")
+    fuel_price = args.get("fuel_price")
+
+    # validate origin points and destination points
+    error = missing_point(get_point_index(), origins, destinations)
+    if error is not None:
+        return {"error": error}, 400
+
+    def generate():
+        yield '{"origins": %s, "destinations": %s, "costs": [' % (
+            json.dumps(origins),
+            json.dumps(destinations),
+        )
+        rows = calculate_distance_rows(origins, destinations)
+        for index, distances in enumerate(rows):
+            row = json.dumps(calculate_costs(distances, autonomy, fuel_price))
+            yield row if index == 0 else ", " + row
+        yield "]}\n"
+
+    return generate(), 200
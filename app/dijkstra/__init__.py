@@ -1,19 +1,77 @@
+import math
 from collections import defaultdict, deque
+from functools import partial
+from heapq import heappop, heappush
+
+EARTH_RADIUS = 6371.0
 
 
 class Graph(object):
+    """Directed graph of routes.
+
+    Every route is an edge identified by a ``key``: the route's primary
+    key, or its pair of points when none is given. ``routes`` maps keys to
+    pairs and ``distances`` holds the shortest route of each pair, which is
+    what the search engines follow. Pairs with parallel routes also keep
+    them apart in ``parallel``, where the route that was alone on the pair
+    is filed under ``None``; other pairs need no dict of their own.
+    """
+
     def __init__(self):
         self.nodes = set()
         self.edges = defaultdict(list)
+        self.reverse_edges = defaultdict(list)
         self.distances = {}
+        self.routes = {}
+        self.parallel = {}
+        self.coordinates = {}
 
     def add_node(self, value):
         self.nodes.add(value)
 
-    def add_edge(self, from_node, to_node, distance):
-        self.edges[from_node].append(to_node)
-        self.edges[to_node].append(from_node)
-        self.distances[(from_node, to_node)] = distance
+    def set_coordinates(self, node, x, y):
+        self.coordinates[node] = (x, y)
+
+    def add_edge(self, from_node, to_node, distance, key=None):
+        pair = (from_node, to_node)
+        if key is None:
+            key = pair
+        if key in self.routes:
+            self.remove_edge(key)
+
+        current = self.distances.get(pair)
+        if current is None:
+            self.edges[from_node].append(to_node)
+            self.reverse_edges[to_node].append(from_node)
+            self.distances[pair] = distance
+        else:
+            parallel = self.parallel.get(pair)
+            if parallel is None:
+                parallel = self.parallel[pair] = {None: current}
+            parallel[key] = distance
+            self.distances[pair] = min(current, distance)
+        self.routes[key] = pair
+
+    def remove_edge(self, key):
+        pair = self.routes.pop(key)
+        parallel = self.parallel.get(pair)
+        if parallel is None:
+            del self.distances[pair]
+            from_node, to_node = pair
+            self.edges[from_node].remove(to_node)
+            self.reverse_edges[to_node].remove(from_node)
+            return
+
+        del parallel[key if key in parallel else None]
+        self.distances[pair] = min(parallel.values())
+        if len(parallel) == 1:
+            # the route left is alone on the pair again
+            del self.parallel[pair]
+
+    def update_edge(self, key, from_node, to_node, distance):
+        self.remove_edge(key)
+        self.add_node(from_node)
+        self.add_edge(from_node, to_node, distance, key)
 
 
 def dijkstra(graph, initial):
@@ -48,8 +106,53 @@ def dijkstra(graph, initial):
     return visited, path
 
 
-def get_shortest_path(graph, origin, destination):
-    visited, paths = dijkstra(graph, origin)
+def heap_dijkstra(graph, initial, destination=None, stats=None):
+    """Priority-queue Dijkstra with lazy deletion.
+
+    Returns the same ``(visited, path)`` pair as :func:`dijkstra`. When
+    ``destination`` is given the search stops as soon as it is settled, so
+    only ``visited[destination]`` is guaranteed to be final. Settled nodes
+    and relaxed edges are counted into ``stats`` when a dict is given.
+    """
+    visited = {initial: 0}
+    path = {}
+    settled = set()
+    distances = graph.distances
+    queue = [(0, initial)]
+    relaxed = 0
+
+    while queue:
+        current_weight, min_node = heappop(queue)
+        if min_node in settled:
+            continue
+        settled.add(min_node)
+
+        if min_node == destination:
+            break
+
+        for edge in graph.edges[min_node]:
+            distance = distances.get((min_node, edge))
+            if distance is None:
+                continue
+            relaxed += 1
+            weight = current_weight + distance
+            if edge not in visited or weight < visited[edge]:
+                visited[edge] = weight
+                path[edge] = min_node
+                heappush(queue, (weight, edge))
+
+    if stats is not None:
+        count_search(stats, len(settled), relaxed)
+
+    return visited, path
+
+
+def count_search(stats, settled, relaxed):
+    stats["settled"] = stats.get("settled", 0) + settled
+    stats["relaxed"] = stats.get("relaxed", 0) + relaxed
+
+
+def build_path(paths, origin, destination):
     full_path = deque()
     _destination = paths[destination]
 
@@ -60,4 +163,163 @@ def get_shortest_path(graph, origin, destination):
     full_path.appendleft(origin)
     full_path.append(destination)
 
-    return visited[destination], list(full_path)
+    return list(full_path)
+
+
+def bidirectional_dijkstra(graph, origin, destination, stats=None):
+    """Point-to-point search growing one tree forward from ``origin`` and
+    one backward from ``destination`` until they meet.
+
+    Returns ``(distance, path)`` and raises ``KeyError`` when there is no
+    path, like :func:`get_shortest_path`.
+    """
+    if origin == destination:
+        raise KeyError(destination)
+
+    distances = graph.distances
+    visited = ({origin: 0}, {destination: 0})
+    paths = ({}, {})
+    settled = (set(), set())
+    queues = ([(0, origin)], [(0, destination)])
+    adjacency = (graph.edges, graph.reverse_edges)
+
+    best, meeting = None, None
+    relaxed = 0
+
+    while queues[0] and queues[1]:
+        if best is not None and queues[0][0][0] + queues[1][0][0] >= best:
+            break
+
+        # expand the side whose frontier is closer
+        side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+        other = 1 - side
+
+        current_weight, min_node = heappop(queues[side])
+        if min_node in settled[side]:
+            continue
+        settled[side].add(min_node)
+
+        for edge in adjacency[side][min_node]:
+            if side == 0:
+                distance = distances.get((min_node, edge))
+            else:
+                distance = distances.get((edge, min_node))
+            if distance is None:
+                continue
+            relaxed += 1
+            weight = current_weight + distance
+            if edge not in visited[side] or weight < visited[side][edge]:
+                visited[side][edge] = weight
+                paths[side][edge] = min_node
+                heappush(queues[side], (weight, edge))
+                if edge in visited[other]:
+                    total = weight + visited[other][edge]
+                    if best is None or total < best:
+                        best, meeting = total, edge
+
+    if stats is not None:
+        count_search(stats, len(settled[0]) + len(settled[1]), relaxed)
+
+    if meeting is None:
+        raise KeyError(destination)
+
+    full_path = deque([meeting])
+    node = meeting
+    while node != origin:
+        node = paths[0][node]
+        full_path.appendleft(node)
+    node = meeting
+    while node != destination:
+        node = paths[1][node]
+        full_path.append(node)
+
+    return best, list(full_path)
+
+
+def euclidean(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def great_circle(a, b):
+    """Haversine distance in kilometres between ``(latitude, longitude)``
+    pairs given in degrees."""
+    latitude_a, longitude_a = map(math.radians, a)
+    latitude_b, longitude_b = map(math.radians, b)
+    h = (
+        math.sin((latitude_b - latitude_a) / 2) ** 2
+        + math.cos(latitude_a)
+        * math.cos(latitude_b)
+        * math.sin((longitude_b - longitude_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def astar(graph, origin, destination, heuristic=great_circle, stats=None):
+    """A* search directed by ``heuristic(coordinates, coordinates)``.
+
+    The heuristic must never overestimate the route distance between two
+    points. Nodes without coordinates get a zero estimate, and without
+    coordinates for ``destination`` this is plain Dijkstra.
+    """
+    target = graph.coordinates.get(destination)
+    if target is None:
+        return heap_shortest_path(graph, origin, destination, stats)
+
+    coordinates = graph.coordinates
+    distances = graph.distances
+    estimates = {}
+
+    def estimate(node):
+        if node not in estimates:
+            point = coordinates.get(node)
+            estimates[node] = 0 if point is None else heuristic(point, target)
+        return estimates[node]
+
+    visited = {origin: 0}
+    paths = {}
+    queue = [(estimate(origin), 0, origin)]
+    settled = relaxed = 0
+
+    while queue:
+        _, current_weight, min_node = heappop(queue)
+        # stale entry, or a node reopened through a shorter path
+        if current_weight > visited[min_node]:
+            continue
+        settled += 1
+
+        if min_node == destination:
+            break
+
+        for edge in graph.edges[min_node]:
+            distance = distances.get((min_node, edge))
+            if distance is None:
+                continue
+            relaxed += 1
+            weight = current_weight + distance
+            if edge not in visited or weight < visited[edge]:
+                visited[edge] = weight
+                paths[edge] = min_node
+                heappush(queue, (weight + estimate(edge), weight, edge))
+
+    if stats is not None:
+        count_search(stats, settled, relaxed)
+
+    return visited[destination], build_path(paths, origin, destination)
+
+
+def heap_shortest_path(graph, origin, destination, stats=None):
+    visited, paths = heap_dijkstra(graph, origin, destination, stats)
+
+    return visited[destination], build_path(paths, origin, destination)
+
+
+ENGINES = {
+    "dijkstra": heap_shortest_path,
+    "bidirectional": bidirectional_dijkstra,
+    "astar": partial(astar, heuristic=great_circle),
+    "astar_euclidean": partial(astar, heuristic=euclidean),
+}
+
+
+def get_shortest_path(graph, origin, destination, engine="dijkstra", stats=None):
+    return ENGINES[engine](graph, origin, destination, stats=stats)
@@ -0,0 +1,74 @@
+from app.dijkstra.csr import UNREACHED, build_csr_path, csr_dijkstra
+
+
+class AllPairs(object):
+    """Shortest-path table between every pair of points of a small network.
+
+    Row ``i`` of ``distances`` and ``predecessors`` is the shortest-path
+    tree of point ``i``, as returned by :func:`csr_dijkstra`, so answering a
+    query only walks the path. The table takes ``12 * len(graph) ** 2``
+    bytes.
+    """
+
+    def __init__(self, graph, distances, predecessors):
+        self.graph = graph
+        self.distances = distances
+        self.predecessors = predecessors
+
+    def __len__(self):
+        return len(self.graph)
+
+    @classmethod
+    def build(cls, graph, pool=None):
+        """Run :func:`csr_dijkstra` from every point of ``graph``, a
+        :class:`app.dijkstra.csr.CSRGraph`, on the processes of ``pool``
+        (a :class:`app.dijkstra.parallel.SearchPool`) when given."""
+        sources = range(len(graph))
+        if pool is not None:
+            trees = pool.trees(sources)
+        else:
+            trees = (csr_dijkstra(graph, source) for source in sources)
+
+        distances = []
+        predecessors = []
+        for dist, pred in trees:
+            distances.append(dist)
+            predecessors.append(pred)
+
+        return cls(graph, distances, predecessors)
+
+    def shortest_path(self, origin, destination):
+        """Returns ``(distance, path)`` and raises ``KeyError`` when there is
+        no path, like :func:`app.dijkstra.get_shortest_path`."""
+        source, target = self.graph.ids[origin], self.graph.ids[destination]
+        pred = self.predecessors[source]
+
+        return self.distances[source][target], build_csr_path(
+            self.graph, pred, source, target
+        )
+
+    def shortest_paths(self, origin, destinations):
+        """Distances and paths from ``origin`` to every reachable point of
+        ``destinations``, like :func:`app.models.calculate_shortest_paths`."""
+        results = {}
+        for destination in destinations:
+            try:
+                results[destination] = self.shortest_path(origin, destination)
+            except KeyError:
+                pass
+        return results
+
+    def distance_row(self, origin, destinations):
+        """Distances from ``origin`` to each of ``destinations``, ``None``
+        where unreachable."""
+        ids = self.graph.ids
+        row = self.distances[ids[origin]] if origin in ids else None
+
+        distances = []
+        for destination in destinations:
+            target = ids.get(destination)
+            if row is None or target is None or row[target] == UNREACHED:
+                distances.append(None)
+            else:
+                distances.append(row[target])
+        return distances
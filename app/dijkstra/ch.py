@@ -0,0 +1,243 @@
+import os
+import pickle
+import tempfile
+from collections import defaultdict
+from heapq import heapify, heappop, heappush
+
+from app.dijkstra import count_search
+
+INFINITY = float("inf")
+
+
+def replace_file(temporary, path):
+    """Move a finished ``temporary`` file over ``path``.
+
+    Temporary files are created ``0600``; the file gets the mode ``open``
+    would have given it, so workers running as other users can read it.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temporary, 0o666 & ~umask)
+    os.replace(temporary, path)
+
+
+class ContractionHierarchy(object):
+    """Contraction Hierarchy over a static :class:`app.dijkstra.Graph`.
+
+    Nodes are contracted in order of ``rank``. Contracting a node adds a
+    shortcut between two of its neighbours whenever the path through it is
+    the only shortest one; ``middle`` records the contracted node so paths
+    can be unpacked. Queries only follow edges towards higher ranks, from
+    both ends. ``revision`` is the route change feed entry the hierarchy was
+    built at, if any.
+    """
+
+    def __init__(self, rank, upward, downward, middle, revision=None):
+        self.rank = rank
+        self.upward = upward
+        self.downward = downward
+        self.middle = middle
+        self.revision = revision
+
+    @classmethod
+    def build(cls, graph, witness_limit=64):
+        outgoing = defaultdict(dict)
+        incoming = defaultdict(dict)
+        weights = {}
+        for (origin, destination), distance in graph.distances.items():
+            if origin == destination:
+                continue
+            outgoing[origin][destination] = distance
+            incoming[destination][origin] = distance
+            weights[(origin, destination)] = distance
+
+        middle = {}
+        contracted_neighbours = defaultdict(int)
+        level = defaultdict(int)
+
+        def witness_search(source, excluded, limit, targets):
+            visited = {source: 0}
+            queue = [(0, source)]
+            remaining = set(targets)
+            settled = 0
+
+            while queue and remaining and settled < witness_limit:
+                current_weight, node = heappop(queue)
+                if current_weight > limit:
+                    break
+                if current_weight > visited[node]:
+                    continue
+                settled += 1
+                remaining.discard(node)
+                for edge, distance in outgoing[node].items():
+                    if edge == excluded:
+                        continue
+                    weight = current_weight + distance
+                    if edge not in visited or weight < visited[edge]:
+                        visited[edge] = weight
+                        heappush(queue, (weight, edge))
+
+            return visited
+
+        def shortcuts(node):
+            found = []
+            for origin, incoming_distance in incoming[node].items():
+                targets = {
+                    destination: incoming_distance + outgoing_distance
+                    for destination, outgoing_distance in outgoing[node].items()
+                    if destination != origin
+                }
+                if not targets:
+                    continue
+                witnesses = witness_search(origin, node, max(targets.values()), targets)
+                for destination, weight in targets.items():
+                    if witnesses.get(destination, INFINITY) > weight:
+                        found.append((origin, destination, weight))
+            return found
+
+        def priority(node):
+            edge_difference = (
+                len(shortcuts(node)) - len(incoming[node]) - len(outgoing[node])
+            )
+            return 2 * edge_difference + contracted_neighbours[node] + level[node]
+
+        nodes = set(outgoing) | set(incoming)
+        queue = [(priority(node), node) for node in nodes]
+        heapify(queue)
+        rank = {}
+
+        while queue:
+            _, node = heappop(queue)
+            # lazy update: contract only if still the cheapest node
+            current = priority(node)
+            if queue and current > queue[0][0]:
+                heappush(queue, (current, node))
+                continue
+
+            rank[node] = len(rank)
+            for origin, destination, weight in shortcuts(node):
+                if weight < outgoing[origin].get(destination, INFINITY):
+                    outgoing[origin][destination] = weight
+                    incoming[destination][origin] = weight
+                    weights[(origin, destination)] = weight
+                    middle[(origin, destination)] = node
+
+            for origin in incoming.pop(node, {}):
+                del outgoing[origin][node]
+                contracted_neighbours[origin] += 1
+                level[origin] = max(level[origin], level[node] + 1)
+            for destination in outgoing.pop(node, {}):
+                del incoming[destination][node]
+                contracted_neighbours[destination] += 1
+                level[destination] = max(level[destination], level[node] + 1)
+
+        upward = defaultdict(list)
+        downward = defaultdict(list)
+        for (origin, destination), weight in weights.items():
+            if rank[origin] < rank[destination]:
+                upward[origin].append((destination, weight))
+            else:
+                downward[destination].append((origin, weight))
+
+        return cls(rank, dict(upward), dict(downward), middle)
+
+    def save(self, path):
+        """Write to ``path`` atomically, so readers never see a partial file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as handle:
+            pickle.dump(
+                (self.rank, self.upward, self.downward, self.middle, self.revision),
+                handle,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        replace_file(handle.name, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as handle:
+            return cls(*pickle.load(handle))
+
+    def unpack(self, origin, destination):
+        """Original nodes after ``origin`` on the edge ``origin -> destination``."""
+        nodes = []
+        stack = [(origin, destination)]
+        while stack:
+            edge = stack.pop()
+            node = self.middle.get(edge)
+            if node is None:
+                nodes.append(edge[1])
+            else:
+                stack.append((node, edge[1]))
+                stack.append((edge[0], node))
+        return nodes
+
+    def shortest_path(self, origin, destination, stats=None):
+        """Returns ``(distance, path)`` and raises ``KeyError`` when there is
+        no path, like :func:`app.dijkstra.get_shortest_path`, counting into
+        ``stats`` the same way."""
+        if origin == destination or not {origin, destination} <= self.rank.keys():
+            raise KeyError(destination)
+
+        # side 0 searches upward from origin, side 1 backward from destination
+        adjacency = (self.upward, self.downward)
+        visited = ({origin: 0}, {destination: 0})
+        paths = ({}, {})
+        queues = ([(0, origin)], [(0, destination)])
+        best, meeting = INFINITY, None
+        settled = relaxed = 0
+
+        while queues[0] or queues[1]:
+            if not queues[1] or (queues[0] and queues[0][0][0] <= queues[1][0][0]):
+                side = 0
+            else:
+                side = 1
+            current_weight, node = heappop(queues[side])
+            if current_weight >= best:
+                del queues[side][:]
+                continue
+            if current_weight > visited[side][node]:
+                continue
+            settled += 1
+
+            if node in visited[1 - side]:
+                total = current_weight + visited[1 - side][node]
+                if total < best:
+                    best, meeting = total, node
+
+            # stall-on-demand: skip nodes reached more cheaply from above
+            if any(
+                edge in visited[side]
+                and visited[side][edge] + distance < current_weight
+                for edge, distance in adjacency[1 - side].get(node, ())
+            ):
+                continue
+
+            for edge, distance in adjacency[side].get(node, ()):
+                relaxed += 1
+                weight = current_weight + distance
+                if edge not in visited[side] or weight < visited[side][edge]:
+                    visited[side][edge] = weight
+                    paths[side][edge] = node
+                    heappush(queues[side], (weight, edge))
+
+        if stats is not None:
+            count_search(stats, settled, relaxed)
+        if meeting is None:
+            raise KeyError(destination)
+
+        edges = []
+        node = meeting
+        while node != origin:
+            edges.append((paths[0][node], node))
+            node = paths[0][node]
+        edges.reverse()
+        node = meeting
+        while node != destination:
+            edges.append((node, paths[1][node]))
+            node = paths[1][node]
+
+        full_path = [origin]
+        for edge in edges:
+            full_path.extend(self.unpack(*edge))
+
+        return best, full_path
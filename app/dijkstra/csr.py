@@ -0,0 +1,335 @@
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from heapq import heappop, heappush
+
+from app.dijkstra import count_search
+from app.dijkstra.ch import replace_file
+
+UNREACHED = -1
+
+# snapshot header: magic, nodes, edges, bytes of names, route revision
+SNAPSHOT_MAGIC = b"RTCSR\x00\x00\x02"
+SNAPSHOT_HEADER = struct.Struct("=8sqqqQ")
+
+
+class CSRGraph(object):
+    """Compact, read-only graph in compressed sparse row form.
+
+    Point names are interned to integer ids. The outgoing routes of node
+    ``i`` are ``targets[offsets[i]:offsets[i + 1]]`` with the matching
+    ``weights``, so searches never hash strings. ``revision`` is the route
+    change feed entry the graph was built at, if any.
+    """
+
+    def __init__(
+        self,
+        names,
+        offsets,
+        targets,
+        weights,
+        revision=None,
+        ids=None,
+        incoming=None,
+    ):
+        self.names = names
+        if ids is None:
+            ids = {name: node for node, name in enumerate(names)}
+        self.ids = ids
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.revision = revision
+        self._incoming = incoming
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def incoming(self):
+        """Whether some route ends at each node, by node id."""
+        if self._incoming is None:
+            incoming = bytearray(len(self))
+            for target in self.targets:
+                incoming[target] = 1
+            self._incoming = incoming
+        return self._incoming
+
+    def has_origin(self, name):
+        """Whether some route starts at ``name``."""
+        node = self.ids.get(name)
+        return node is not None and self.offsets[node + 1] > self.offsets[node]
+
+    def has_destination(self, name):
+        """Whether some route ends at ``name``."""
+        node = self.ids.get(name)
+        return node is not None and bool(self.incoming[node])
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Build from ``(origin_point, destination_point, distance)`` rows."""
+        ids = {}
+        names = []
+        sources = array("i")
+        targets = array("i")
+        weights = array("q")
+
+        for origin, destination, distance in edges:
+            for name in (origin, destination):
+                if name not in ids:
+                    ids[name] = len(names)
+                    names.append(name)
+            sources.append(ids[origin])
+            targets.append(ids[destination])
+            weights.append(distance)
+
+        # counting sort of the edges by source node
+        offsets = array("q", [0]) * (len(names) + 1)
+        for source in sources:
+            offsets[source + 1] += 1
+        for node in range(len(names)):
+            offsets[node + 1] += offsets[node]
+
+        cursor = array("q", offsets)
+        sorted_targets = array("i", [0]) * len(targets)
+        sorted_weights = array("q", [0]) * len(weights)
+        for source, target, weight in zip(sources, targets, weights):
+            position = cursor[source]
+            sorted_targets[position] = target
+            sorted_weights[position] = weight
+            cursor[source] = position + 1
+
+        return cls(names, offsets, sorted_targets, sorted_weights)
+
+    def save(self, path):
+        """Write a snapshot to ``path`` atomically.
+
+        The file holds the header, then ``offsets`` and ``weights`` (int64),
+        the offsets of each name (int64), ``targets`` (int32), a byte per
+        node telling whether routes end there and the UTF-8 names, in native
+        byte order. Nodes are renumbered in name order so
+        :meth:`load` can look names up without building a dict.
+        """
+        encoded = [name.encode("utf-8") for name in self.names]
+        order = sorted(range(len(self)), key=encoded.__getitem__)
+        renumbered = array("i", [0]) * len(self)
+        for node, previous in enumerate(order):
+            renumbered[previous] = node
+
+        offsets = array("q", [0])
+        targets = array("i")
+        weights = array("q")
+        name_offsets = array("q", [0])
+        for previous in order:
+            for position in range(self.offsets[previous], self.offsets[previous + 1]):
+                targets.append(renumbered[self.targets[position]])
+                weights.append(self.weights[position])
+            offsets.append(len(targets))
+            name_offsets.append(name_offsets[-1] + len(encoded[previous]))
+        incoming = bytearray(len(self))
+        for target in targets:
+            incoming[target] = 1
+
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as handle:
+            handle.write(
+                SNAPSHOT_HEADER.pack(
+                    SNAPSHOT_MAGIC,
+                    len(self),
+                    len(targets),
+                    name_offsets[-1],
+                    self.revision or 0,
+                )
+            )
+            for part in (offsets, weights, name_offsets, targets):
+                part.tofile(handle)
+            handle.write(incoming)
+            for previous in order:
+                handle.write(encoded[previous])
+        replace_file(handle.name, path)
+
+    @classmethod
+    def load(cls, path):
+        """Map a snapshot written by :meth:`save` into memory.
+
+        The arrays are read straight from the mapping, so every worker
+        loading the same file shares one copy in the page cache.
+        """
+        with open(path, "rb") as handle:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, nodes, edges, size, revision = SNAPSHOT_HEADER.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("{} is not a route snapshot".format(path))
+
+        view = memoryview(buffer)
+        position = SNAPSHOT_HEADER.size
+        parts = []
+        for typecode, count in (
+            ("q", nodes + 1),
+            ("q", edges),
+            ("q", nodes + 1),
+            ("i", edges),
+            ("B", nodes),
+            ("B", size),
+        ):
+            end = position + count * struct.calcsize(typecode)
+            parts.append(view[position:end].cast(typecode))
+            position = end
+        offsets, weights, name_offsets, targets, incoming, data = parts
+
+        names = MappedNames(name_offsets, data)
+        return cls(
+            names, offsets, targets, weights, revision, MappedIds(names), incoming
+        )
+
+
+class MappedNames(object):
+    """Sorted point names of a snapshot, decoded on access."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def encoded(self, node):
+        return self.data[self.offsets[node] : self.offsets[node + 1]].tobytes()
+
+    def __getitem__(self, node):
+        if not 0 <= node < len(self):
+            raise IndexError(node)
+        return self.encoded(node).decode("utf-8")
+
+    def index(self, name):
+        """Node id of ``name``, by bisection; raises ``KeyError``."""
+        key = name.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.encoded(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self) or self.encoded(low) != key:
+            raise KeyError(name)
+        return low
+
+
+class MappedIds(object):
+    """``name -> node id`` lookups over :class:`MappedNames`."""
+
+    def __init__(self, names):
+        self.names = names
+
+    def __getitem__(self, name):
+        return self.names.index(name)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def get(self, name, default=None):
+        try:
+            return self.names.index(name)
+        except KeyError:
+            return default
+
+
+def csr_dijkstra(graph, source, target=UNREACHED, stats=None):
+    """Heap Dijkstra over integer ids.
+
+    Returns ``(dist, pred)`` arrays indexed by node id, with ``UNREACHED``
+    for nodes the search did not reach. Stops once ``target`` is settled.
+    Settled nodes and relaxed edges are counted into ``stats`` when a dict
+    is given, like :func:`app.dijkstra.heap_dijkstra`.
+    """
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    dist = array("q", [UNREACHED]) * len(graph)
+    pred = array("i", [UNREACHED]) * len(graph)
+    dist[source] = 0
+    queue = [(0, source)]
+    settled = relaxed = 0
+
+    while queue:
+        current_weight, node = heappop(queue)
+        if current_weight > dist[node]:
+            continue
+        settled += 1
+        if node == target:
+            break
+
+        start, end = offsets[node], offsets[node + 1]
+        relaxed += end - start
+        for position in range(start, end):
+            edge = targets[position]
+            weight = current_weight + weights[position]
+            if dist[edge] == UNREACHED or weight < dist[edge]:
+                dist[edge] = weight
+                pred[edge] = node
+                heappush(queue, (weight, edge))
+
+    if stats is not None:
+        count_search(stats, settled, relaxed)
+
+    return dist, pred
+
+
+def build_csr_path(graph, pred, source, target):
+    if pred[target] == UNREACHED:
+        raise KeyError(graph.names[target])
+
+    path = [target]
+    while path[-1] != source:
+        path.append(pred[path[-1]])
+    path.reverse()
+
+    return [graph.names[node] for node in path]
+
+
+def csr_distance_row(graph, origin, destinations, stats=None):
+    """Distances from ``origin`` to each of ``destinations``, ``None`` where
+    unreachable, from a single search tree."""
+    ids = graph.ids
+    if origin not in ids:
+        return [None] * len(destinations)
+    dist, _ = csr_dijkstra(graph, ids[origin], stats=stats)
+
+    row = []
+    for destination in destinations:
+        target = ids.get(destination)
+        if target is None or dist[target] == UNREACHED:
+            row.append(None)
+        else:
+            row.append(dist[target])
+    return row
+
+
+def csr_shortest_paths(graph, origin, destinations, stats=None):
+    """Distances and paths from ``origin`` to every reachable point of
+    ``destinations``, from a single search tree."""
+    ids = graph.ids
+    if origin not in ids:
+        return {}
+    source = ids[origin]
+    dist, pred = csr_dijkstra(graph, source, stats=stats)
+
+    results = {}
+    for destination in destinations:
+        target = ids.get(destination)
+        if target is None or target == source or pred[target] == UNREACHED:
+            continue
+        results[destination] = (
+            dist[target],
+            build_csr_path(graph, pred, source, target),
+        )
+    return results
+
+
+def get_csr_shortest_path(graph, origin, destination, stats=None):
+    source, target = graph.ids[origin], graph.ids[destination]
+    dist, pred = csr_dijkstra(graph, source, target, stats)
+
+    return dist[target], build_csr_path(graph, pred, source, target)
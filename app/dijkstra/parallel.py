@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from app.dijkstra.csr import csr_dijkstra, csr_distance_row, csr_shortest_paths
+
+# graph searched by a pool's worker process, set once by the initializer
+_graph = None
+
+
+def _initialize(graph):
+    global _graph
+    _graph = graph
+
+
+def _tree(source):
+    return csr_dijkstra(_graph, source)
+
+
+def _distance_row(origin, destinations):
+    return csr_distance_row(_graph, origin, destinations)
+
+
+def _shortest_paths(origin, destinations):
+    return csr_shortest_paths(_graph, origin, destinations)
+
+
+class SearchPool(object):
+    """Single-source searches over a :class:`app.dijkstra.csr.CSRGraph`,
+    fanned out over a process pool.
+
+    Each worker process receives the graph once, through the pool's
+    initializer; tasks only carry point names and results.
+    """
+
+    def __init__(self, graph, workers=None):
+        self.graph = graph
+        self._executor = ProcessPoolExecutor(
+            workers, initializer=_initialize, initargs=(graph,)
+        )
+
+    def trees(self, sources, chunksize=16):
+        """``(dist, pred)`` arrays of :func:`csr_dijkstra` for each node id
+        of ``sources``, in order."""
+        return self._executor.map(_tree, sources, chunksize=chunksize)
+
+    def distance_rows(self, origins, destinations):
+        """Distances from each of ``origins`` to each of ``destinations``,
+        ``None`` where unreachable, one row per origin, in order."""
+        return self._executor.map(_distance_row, origins, repeat(destinations))
+
+    def shortest_paths(self, origins, destinations):
+        """Distances and paths from each of ``origins`` to every reachable
+        point of the matching list of ``destinations``, in order."""
+        return self._executor.map(_shortest_paths, origins, destinations)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
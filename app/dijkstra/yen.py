@@ -0,0 +1,206 @@
+from heapq import heappop, heappush, nsmallest
+
+from app.dijkstra import build_path, count_search
+
+INFINITY = float("inf")
+
+
+class ReverseTree(object):
+    """Backward Dijkstra search from ``destination``, grown on demand.
+
+    ``remaining`` holds the distance to ``destination`` of every settled
+    point and ``following`` the next point on the way. Every other point is
+    at least ``radius`` away, which is infinite once the search has run out
+    of points, as the rest cannot reach ``destination``.
+    """
+
+    def __init__(self, graph, destination):
+        self.graph = graph
+        self.destination = destination
+        self.remaining = {}
+        self.following = {}
+        self.radius = 0
+        self._tentative = {destination: 0}
+        self._queue = [(0, destination)]
+
+    def grow(self, node):
+        """Settle points until ``node`` is; returns whether it was."""
+        remaining = self.remaining
+        distances = self.graph.distances
+        queue = self._queue
+
+        while node not in remaining and queue:
+            current_weight, min_node = heappop(queue)
+            if min_node in remaining:
+                continue
+            remaining[min_node] = self.radius = current_weight
+
+            for edge in self.graph.reverse_edges[min_node]:
+                if edge in remaining:
+                    continue
+                weight = current_weight + distances[(edge, min_node)]
+                if edge not in self._tentative or weight < self._tentative[edge]:
+                    self._tentative[edge] = weight
+                    self.following[edge] = min_node
+                    heappush(queue, (weight, edge))
+
+        if not queue:
+            self.radius = INFINITY
+        return node in remaining
+
+    def estimate(self, node):
+        return self.remaining.get(node, self.radius)
+
+    def path(self, node):
+        path = [node]
+        while path[-1] != self.destination:
+            path.append(self.following[path[-1]])
+        return path
+
+
+def k_shortest_paths(graph, origin, destination, k, stats=None):
+    """Up to ``k`` loopless paths from ``origin`` to ``destination``,
+    cheapest first, as ``(distance, path)`` pairs (Yen's algorithm).
+
+    Spur searches are A* searches guided by the distances to
+    ``destination`` from a single :class:`ReverseTree`, which removing
+    routes can only make longer. A spur search stops at the first point
+    whose tree path avoids the root path, since following the tree from
+    there is the cheapest way on; usually that is a neighbour of the spur
+    point. Searches also give up past the cost of the candidates that are
+    sure to be chosen. Like Lawler's variant, each path is only spurred
+    from where it left the path it was derived from.
+    """
+    if origin == destination:
+        return []
+
+    tree = ReverseTree(graph, destination)
+    if not tree.grow(origin):
+        return []
+
+    remaining = tree.remaining
+    distances = graph.distances
+    search = {"settled": 0, "relaxed": 0}
+
+    def spur_search(start, is_blocked, blocked_edges, is_clean, limit):
+        visited = {start: 0}
+        paths = {}
+        queue = [(remaining[start], 0, start)]
+
+        while queue:
+            estimate, current_weight, min_node = heappop(queue)
+            if estimate > limit:
+                break
+            if current_weight > visited[min_node]:
+                continue
+            if min_node not in remaining and not tree.grow(min_node):
+                continue
+            if estimate < current_weight + remaining[min_node]:
+                # queued with ``radius`` as its estimate: queue it again
+                # with its distance to ``destination``, now it is settled
+                heappush(
+                    queue,
+                    (current_weight + remaining[min_node], current_weight, min_node),
+                )
+                continue
+            search["settled"] += 1
+
+            if min_node != start and is_clean(min_node):
+                return current_weight + remaining[min_node], paths, min_node
+
+            for edge in graph.edges[min_node]:
+                if is_blocked(edge):
+                    continue
+                if min_node == start and edge in blocked_edges:
+                    continue
+                estimate = tree.estimate(edge)
+                if estimate == INFINITY:
+                    continue
+                search["relaxed"] += 1
+                weight = current_weight + distances[(min_node, edge)]
+                if edge not in visited or weight < visited[edge]:
+                    visited[edge] = weight
+                    paths[edge] = min_node
+                    heappush(queue, (weight + estimate, weight, edge))
+
+        return None
+
+    found = [(remaining[origin], tree.path(origin))]
+    deviations = [0]
+    seen = {tuple(found[0][1])}
+    candidates = []
+
+    while len(found) < k:
+        _, last = found[-1]
+        deviation = deviations[-1]
+
+        # position in ``last`` of the first point of each tree path that is
+        # on ``last``, so a tree path avoids the root ``last[:i + 1]`` when
+        # it is greater than ``i``
+        positions = {node: position for position, node in enumerate(last)}
+        first_hit = {destination: len(last) - 1}
+
+        def hit(node):
+            chain = []
+            while node not in first_hit:
+                chain.append(node)
+                node = tree.following[node]
+            value = first_hit[node]
+            for node in reversed(chain):
+                value = min(value, positions.get(node, value))
+                first_hit[node] = value
+            return value
+
+        # length of the prefix each path found shares with ``last``
+        shared = []
+        for _, path in found:
+            length = 0
+            for a, b in zip(path, last):
+                if a != b:
+                    break
+                length += 1
+            shared.append(length)
+
+        root_weight = sum(distances[(last[i], last[i + 1])] for i in range(deviation))
+
+        for i in range(deviation, len(last) - 1):
+            # the root path ``last[:i + 1]`` may not be left for a point on it,
+            # nor along a route another path found takes from it
+            blocked_edges = {
+                path[i + 1] for (_, path), length in zip(found, shared) if length > i
+            }
+
+            def is_blocked(node):
+                return positions.get(node, i) < i
+
+            def is_clean(node):
+                return node in remaining and hit(node) > i
+
+            # candidates beyond the ones still needed will never be chosen
+            needed = k - len(found)
+            if len(candidates) >= needed:
+                limit = nsmallest(needed, candidates)[-1][0] - root_weight
+            else:
+                limit = INFINITY
+
+            spur = spur_search(last[i], is_blocked, blocked_edges, is_clean, limit)
+            if spur is not None:
+                spur_weight, paths, node = spur
+                path = last[:i] + build_path(paths, last[i], node)
+                path += tree.path(node)[1:]
+                # the limit relies on candidates being distinct
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heappush(candidates, (root_weight + spur_weight, i, path))
+            root_weight += distances[(last[i], last[i + 1])]
+
+        if not candidates:
+            break
+        distance, deviation, path = heappop(candidates)
+        found.append((distance, path))
+        deviations.append(deviation)
+
+    if stats is not None:
+        count_search(stats, len(remaining) + search["settled"], search["relaxed"])
+
+    return found
@@ -1,3 +1,8 @@
+MAX_PATHS = 10
+
+JOB_KINDS = ("batch", "cost", "matrix")
+
+
 def integer_field(value, name):
     if type(value) != int:
         raise ValueError("Value '{}' for field '{}' is not a valid integer.".format(value, name))
@@ -8,3 +13,31 @@ def float_field(value, name):
     if type(value) != float:
         raise ValueError("Value '{}' for field '{}' is not a valid float.".format(value, name))
     return value
+
+
+def positive_integer_field(value, name):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or value <= 0:
+        raise ValueError("Value for field '{}' is not a valid positive integer.".format(name))
+    return value
+
+
+def paths_field(value, name):
+    if type(value) != int or not 1 <= value <= MAX_PATHS:
+        raise ValueError("Value '{}' for field '{}' is not an integer between 1 and {}.".format(value, name, MAX_PATHS))
+    return value
+
+
+def stream_field(value, name):
+    if value not in ("json", "ndjson"):
+        raise ValueError("Value '{}' for field '{}' is not 'json' or 'ndjson'.".format(value, name))
+    return value
+
+
+def job_kind_field(value, name):
+    if value not in JOB_KINDS:
+        raise ValueError("Value '{}' for field '{}' is not one of: {}.".format(value, name, ", ".join(JOB_KINDS)))
+    return value
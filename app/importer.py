@@ -0,0 +1,183 @@
+import csv
+import io
+import json
+
+import sqlalchemy
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.fields import integer_field
+from app.models import Route, RouteRevision, new_version, routing_graph
+
+COLUMNS = ("origin_point", "destination_point", "distance")
+
+# errors reported back to the client; the rest are only counted
+MAX_ERRORS = 100
+
+
+def read_csv(stream):
+    """Yield ``(line, row)`` pairs from a CSV file with a header row."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # CSV has no types; anything that is not an integer is left for
+        # integer_field to reject
+        try:
+            row["distance"] = int(row.get("distance"))
+        except (TypeError, ValueError):
+            pass
+        yield reader.line_num, row
+
+
+def read_ndjson(stream):
+    """Yield ``(line, row)`` pairs from newline-delimited JSON."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+MIMETYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonlines": "ndjson",
+}
+
+
+def validate(row):
+    if not isinstance(row, dict):
+        raise ValueError("Row is not a valid object.")
+
+    for name in COLUMNS:
+        if row.get(name) is None:
+            raise ValueError("Missing required parameter '{}'.".format(name))
+
+    route = (
+        str(row["origin_point"]),
+        str(row["destination_point"]),
+        integer_field(row["distance"], "distance"),
+    )
+    for name, value in zip(COLUMNS, route[:2]):
+        if len(value) > 128:
+            raise ValueError(
+                "Value for field '{}' is longer than 128 characters.".format(name)
+            )
+
+    return route
+
+
+def insert_batch(routes):
+    """Insert ``routes``, skipping ones that already exist, and return how
+    many rows were inserted."""
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        return copy_batch(routes)
+
+    values = [dict(zip(COLUMNS, route)) for route in routes]
+    if dialect == "sqlite":
+        statement = sqlite.insert(Route.__table__).on_conflict_do_nothing()
+        return db.session.execute(statement, values).rowcount
+
+    inserted = 0
+    for value in values:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(Route.__table__.insert(), value)
+            inserted += 1
+        except sqlalchemy.exc.IntegrityError:
+            pass
+    return inserted
+
+
+def copy_buffer(routes):
+    """``routes`` as CSV for ``COPY ... FROM STDIN WITH (FORMAT csv)``."""
+    buffer = io.StringIO()
+    # COPY reads an unquoted empty field as NULL, so an empty point name
+    # must be quoted to stay an empty string
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(routes)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_batch(routes):
+    """PostgreSQL ingestion: ``COPY`` into a temporary table, then move the
+    new rows into ``routes`` in one ``INSERT ... ON CONFLICT DO NOTHING``."""
+    buffer = copy_buffer(routes)
+
+    connection = db.session.connection()
+    connection.execute(
+        sqlalchemy.text(
+            "CREATE TEMPORARY TABLE routes_import "
+            "(origin_point VARCHAR(128), destination_point VARCHAR(128), "
+            "distance INTEGER) ON COMMIT DROP"
+        )
+    )
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(
+            "COPY routes_import (origin_point, destination_point, distance) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    table = Route.__table__
+    imported = sqlalchemy.table(
+        "routes_import", *(sqlalchemy.column(name) for name in COLUMNS)
+    )
+    now = sqlalchemy.func.current_timestamp()
+    version = sqlalchemy.literal(new_version(), sqlalchemy.DateTime)
+    statement = (
+        postgresql.insert(table)
+        .from_select(
+            list(COLUMNS) + ["created_at", "updated_at"],
+            sqlalchemy.select(*imported.columns, now, version),
+        )
+        .on_conflict_do_nothing()
+    )
+    return connection.execute(statement).rowcount
+
+
+def import_routes(rows, batch_size=10000):
+    """Validate ``(line, row)`` pairs and insert them in batches, committing
+    after each batch.
+
+    Returns per-batch ``received``/``inserted`` counts, the number of
+    rejected rows and the first rejection messages.
+    """
+    report = {"batches": [], "inserted": 0, "rejected": 0, "errors": []}
+
+    def flush(batch):
+        inserted = insert_batch(batch)
+        if inserted:
+            # too many changes to replay; other workers reload instead
+            RouteRevision.record("reload")
+        db.session.commit()
+        report["batches"].append({"received": len(batch), "inserted": inserted})
+        report["inserted"] += inserted
+
+    batch = []
+    try:
+        for line, row in rows:
+            try:
+                batch.append(validate(row))
+            except ValueError as e:
+                report["rejected"] += 1
+                if len(report["errors"]) < MAX_ERRORS:
+                    report["errors"].append({"line": line, "error": str(e)})
+                continue
+
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+
+        if batch:
+            flush(batch)
+    finally:
+        if report["inserted"]:
+            routing_graph.invalidate()
+
+    return report
@@ -0,0 +1,169 @@
+import datetime
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from app import app, db
+from app.calculations import (
+    batch_schema,
+    calculate_cost,
+    calculate_cost_batch,
+    calculate_cost_matrix,
+    cost_schema,
+    matrix_schema,
+)
+from app.models import Job
+
+# calculation a job runs and the schema of its params, by kind
+JOB_CALCULATIONS = {
+    "cost": (cost_schema, calculate_cost),
+    "batch": (batch_schema, calculate_cost_batch),
+    "matrix": (matrix_schema, calculate_cost_matrix),
+}
+
+
+class JobQueue(object):
+    """Runs ``run(pk)`` for each job submitted, on a pool of ``workers``
+    threads started on the first submission.
+
+    With no workers, jobs run in the submitting thread before ``submit``
+    returns. The jobs ``recover()`` returns are submitted once, when the
+    queue is first used, to pick up the ones a previous process left.
+    """
+
+    def __init__(self, run, workers=0, recover=None):
+        self.run = run
+        self.workers = workers
+        self.recover = recover
+        self._started = False
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        for pk in self.recover() if self.recover is not None else ():
+            self.submit(pk)
+
+    def submit(self, pk):
+        self.start()
+        if not self.workers:
+            self.run(pk)
+            return
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="jobs"
+                )
+            self._executor.submit(self.run, pk)
+
+    def shutdown(self, wait=True):
+        """Stop the threads, after the queued jobs when ``wait`` is set; the
+        next submission starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def set_status(job, status, status_code=None, result=None):
+    job.status = status
+    job.status_code = status_code
+    job.result = result
+    job.updated_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def claim_job(pk):
+    """Mark job ``pk`` running, unless it is no longer pending because it
+    was queued twice."""
+    claimed = Job.query.filter_by(pk=pk, status="pending").update(
+        {"status": "running", "updated_at": datetime.datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return bool(claimed)
+
+
+def run_job(pk):
+    """Run the calculation of job ``pk`` and store the response its
+    endpoint would have sent.
+
+    The job gets its own application context, and so its own database
+    session, whether it runs on a worker thread or inline.
+    """
+    with app.app_context():
+        if not claim_job(pk):
+            return
+        job = Job.query.get(pk)
+        schema, calculate = JOB_CALCULATIONS[job.kind]
+
+        try:
+            body, status_code = calculate(schema.load(json.loads(job.params)))
+            # a matrix is streamed by its endpoint
+            if isinstance(body, dict):
+                body = json.dumps(body)
+            else:
+                body = "".join(body)
+        except HTTPException as e:
+            # invalid params get the error the endpoint would send
+            status_code = e.code
+            body = json.dumps(getattr(e, "data", None) or {"message": e.description})
+        except Exception:
+            app.logger.exception("Job %s failed", pk)
+            db.session.rollback()
+            set_status(job, "failed", 500, json.dumps({"error": "Job failed."}))
+            return
+
+        status = "done" if status_code < 400 else "failed"
+        set_status(job, status, status_code, body)
+
+
+def recover_jobs():
+    """Fail the jobs still running after ``JOB_TIMEOUT`` seconds, taken to
+    be lost with the process that ran them, and return the pending jobs to
+    queue again.
+
+    Pending jobs other processes still hold are only run once: running a
+    job first claims it.
+    """
+    with app.app_context():
+        lost = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=app.config["JOB_TIMEOUT"]
+        )
+        Job.query.filter(Job.status == "running", Job.updated_at < lost).update(
+            {
+                "status": "failed",
+                "status_code": 500,
+                "result": json.dumps({"error": "Job was interrupted."}),
+                "updated_at": datetime.datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+
+        pending = Job.query.filter_by(status="pending").order_by(Job.pk)
+        return [pk for pk, in pending.with_entities(Job.pk)]
+
+
+job_queue = JobQueue(run_job, app.config["JOB_WORKERS"], recover_jobs)
+
+
+def submit_job(kind, params):
+    """Store a job running ``params`` through the ``kind`` endpoint, queue
+    it and return it."""
+    job = Job(kind=kind, params=json.dumps(params))
+    db.session.add(job)
+    db.session.commit()
+
+    job_queue.submit(job.pk)
+    # the job is updated in another session
+    db.session.expire(job)
+
+    return job
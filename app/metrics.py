@@ -0,0 +1,170 @@
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from time import perf_counter
+
+from flask import g, has_request_context, request
+
+from app import app
+
+# upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+HISTOGRAMS = (
+    ("routes_api_request_seconds", "endpoint", "Time spent handling requests."),
+    ("routes_api_span_seconds", "span", "Time spent in each phase of a request."),
+)
+
+COUNTERS = (
+    ("routes_api_searches_total", "searches", "Shortest-path searches run."),
+    ("routes_api_search_settled_total", "settled", "Points settled by searches."),
+    ("routes_api_search_relaxed_total", "relaxed", "Routes relaxed by searches."),
+)
+
+_disabled = nullcontext()
+
+
+class Histogram(object):
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Span(object):
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.observe_span(self.name, perf_counter() - self.start)
+
+
+class Metrics(object):
+    """Timings and search counters of this worker, exported in the
+    Prometheus text format.
+
+    Nothing is measured unless ``enabled`` is set, or ``server_timing``,
+    which only collects the spans of the current request for its
+    ``Server-Timing`` header.
+    """
+
+    def __init__(self, enabled=False, server_timing=False):
+        self.enabled = enabled
+        self.server_timing = server_timing
+        self._histograms = {name: {} for name, _, _ in HISTOGRAMS}
+        # counts by engine
+        self._counters = {name: {} for _, name, _ in COUNTERS}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        """Context manager timing a phase of the current request."""
+        if not (self.enabled or self.server_timing):
+            return _disabled
+        return Span(self, name)
+
+    def observe(self, metric, label, seconds):
+        with self._lock:
+            histograms = self._histograms[metric]
+            if label not in histograms:
+                histograms[label] = Histogram()
+            histograms[label].observe(seconds)
+
+    def observe_span(self, name, seconds):
+        if self.enabled:
+            self.observe("routes_api_span_seconds", name, seconds)
+        if self.server_timing and has_request_context():
+            timings = g.setdefault("server_timing", {})
+            timings[name] = timings.get(name, 0) + seconds
+
+    def search_stats(self):
+        """A dict for a search engine to count into, or ``None`` when
+        disabled."""
+        return {} if self.enabled else None
+
+    def count_search(self, stats, engine, searches=1):
+        """Add ``searches`` run by ``engine``, with the counts of
+        :meth:`search_stats` when the engine reports them."""
+        if stats is None:
+            return
+        with self._lock:
+            for name, value in (("searches", searches),) + tuple(stats.items()):
+                counter = self._counters[name]
+                counter[engine] = counter.get(engine, 0) + value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for metric, label, description in HISTOGRAMS:
+                lines.append("# HELP {} {}".format(metric, description))
+                lines.append("# TYPE {} histogram".format(metric))
+                for value, histogram in sorted(self._histograms[metric].items()):
+                    labels = '{}="{}"'.format(label, value)
+                    total = 0
+                    for bound, count in zip(BUCKETS + ("+Inf",), histogram.buckets):
+                        total += count
+                        lines.append(
+                            '{}_bucket{{{},le="{}"}} {}'.format(
+                                metric, labels, bound, total
+                            )
+                        )
+                    lines.append(
+                        "{}_sum{{{}}} {}".format(metric, labels, histogram.sum)
+                    )
+                    lines.append(
+                        "{}_count{{{}}} {}".format(metric, labels, histogram.count)
+                    )
+
+            for metric, name, description in COUNTERS:
+                lines.append("# HELP {} {}".format(metric, description))
+                lines.append("# TYPE {} counter".format(metric))
+                for engine, value in sorted(self._counters[name].items()):
+                    lines.append('{}{{engine="{}"}} {}'.format(metric, engine, value))
+
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            for histograms in self._histograms.values():
+                histograms.clear()
+            for counter in self._counters.values():
+                counter.clear()
+
+
+metrics = Metrics(app.config["METRICS_ENABLED"], app.config["SERVER_TIMING"])
+
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_started = perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    if metrics.enabled and "request_started" in g:
+        metrics.observe(
+            "routes_api_request_seconds",
+            request.endpoint or "unknown",
+            perf_counter() - g.request_started,
+        )
+
+    timings = g.get("server_timing")
+    if timings:
+        response.headers["Server-Timing"] = ", ".join(
+            "{};dur={:.3f}".format(name, seconds * 1000)
+            for name, seconds in timings.items()
+        )
+
+    return response
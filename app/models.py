@@ -1,5 +1,28 @@
-from app import db
-from app.dijkstra import Graph, get_shortest_path
+import datetime
+from collections import defaultdict
+
+from app import app, db
+from app.cache import (
+    GAP_WINDOW,
+    BackgroundBuild,
+    FileCache,
+    PathCache,
+    PoolCache,
+    PolledValue,
+    RoutingGraph,
+)
+from app.dijkstra import build_path, get_shortest_path, heap_dijkstra
+from app.dijkstra.allpairs import AllPairs
+from app.dijkstra.ch import ContractionHierarchy
+from app.dijkstra.csr import (
+    CSRGraph,
+    csr_distance_row,
+    csr_shortest_paths,
+    get_csr_shortest_path,
+)
+from app.dijkstra.parallel import SearchPool
+from app.dijkstra.yen import k_shortest_paths
+from app.metrics import metrics
 import sqlalchemy
 
 
@@ -12,14 +35,28 @@ class Base(db.Model):
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
 
+def new_version():
+    """A new ``updated_at`` for a route, which is also its entity tag.
+
+    Versions come from Python on every database, so an ``If-Match`` tag
+    compares equal to the stored value: ``CURRENT_TIMESTAMP`` only has
+    seconds on SQLite, and is stored there in another format than bound
+    datetimes.
+    """
+    return datetime.datetime.utcnow()
+
+
 class Route(Base):
 
     __tablename__ = "routes"
 
-    origin_point = db.Column(db.String(128), nullable=False)
+    updated_at = db.Column(db.DateTime, default=new_version)
+
+    origin_point = db.Column(db.String(128), nullable=False, index=True)
     destination_point = db.Column(
         db.String(128),
         nullable=False,
+        index=True,
     )
     distance = db.Column(db.Integer, nullable=False)
 
@@ -39,18 +76,587 @@ class Route(Base):
 
         return cost, " ".join(path)
 
+    @classmethod
+    def calculate_alternatives(cls, origin, destination, autonomy, fuel_price, k):
+        """Cost and path of up to ``k`` loopless paths, cheapest first."""
+        return [
+            (calculate_cost(distance, autonomy, fuel_price), " ".join(path))
+            for distance, path in calculate_k_shortest_paths(origin, destination, k)
+        ]
+
+    @classmethod
+    def calculate_batch(cls, items):
+        """Cost and path for each ``(origin, destination, autonomy, fuel_price)``
+        item, running a single shortest-path tree per distinct origin.
+
+        Items whose destination cannot be reached yield ``None``.
+        """
+        destinations = defaultdict(set)
+        for origin, destination, _, _ in items:
+            destinations[origin].add(destination)
+
+        trees = calculate_shortest_path_trees(destinations)
+
+        results = []
+        for origin, destination, autonomy, fuel_price in items:
+            if destination not in trees[origin]:
+                results.append(None)
+                continue
+            distance, path = trees[origin][destination]
+            results.append(
+                (calculate_cost(distance, autonomy, fuel_price), " ".join(path))
+            )
+
+        return results
+
+
+class Point(Base):
+
+    __tablename__ = "points"
+
+    name = db.Column(db.String(128), nullable=False, unique=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return "<Point {0} ({1}, {2})>".format(self.name, self.latitude, self.longitude)
+
+
+class RouteRevision(Base):
+    """Change feed of the ``routes`` table, one row per write.
+
+    Each revision holds the route as written, so workers can bring their
+    graphs up to date by replaying the revisions they have not seen. Every
+    ``GAP_WINDOW`` revisions, the ones no worker replays any more are
+    pruned.
+    """
+
+    __tablename__ = "route_revisions"
+
+    action = db.Column(db.String(8), nullable=False)
+    route_pk = db.Column(db.Integer)
+    origin_point = db.Column(db.String(128))
+    destination_point = db.Column(db.String(128))
+    distance = db.Column(db.Integer)
+
+    def __repr__(self):
+        return "<RouteRevision {0} {1} {2}>".format(self.pk, self.action, self.route_pk)
+
+    @classmethod
+    def record(cls, action, route=None):
+        """Log a write of ``route`` in the current transaction and return the
+        revision number.
+
+        Pending changes are flushed first, so the route's row is locked
+        before the revision is numbered and the revisions of a route follow
+        the order in which its writes commit.
+        """
+        db.session.flush()
+        revision = cls(action=action)
+        if route is not None:
+            revision.route_pk = route.pk
+            revision.origin_point = route.origin_point
+            revision.destination_point = route.destination_point
+            revision.distance = route.distance
+        db.session.add(revision)
+        db.session.flush()
+
+        if revision.pk % GAP_WINDOW == 0:
+            cls.prune(revision.pk)
+        return revision.pk
+
+    @classmethod
+    def prune(cls, head):
+        """Delete the revisions that workers at most ``REVISION_RETENTION``
+        revisions behind ``head`` no longer wait for.
+
+        Workers further behind reload the network instead of replaying the
+        feed, and the others still await revisions up to ``GAP_WINDOW``
+        below their own.
+        """
+        before = head - app.config["REVISION_RETENTION"] - GAP_WINDOW
+        return cls.query.filter(cls.pk <= before).delete(synchronize_session=False)
+
+
+class Job(Base):
+    """A calculation run in the background by :mod:`app.jobs`.
+
+    ``params`` holds the JSON body of the request to the calculation
+    endpoint named by ``kind``; once the job has run, ``status_code`` and
+    ``result`` hold its response.
+    """
+
+    __tablename__ = "jobs"
+
+    kind = db.Column(db.String(16), nullable=False)
+    status = db.Column(db.String(8), nullable=False, default="pending")
+    params = db.Column(db.Text, nullable=False)
+    status_code = db.Column(db.Integer)
+    result = db.Column(db.Text)
+
+    def __repr__(self):
+        return "<Job {0} {1} {2}>".format(self.pk, self.kind, self.status)
+
+
+def query_routes():
+    """Query of ``(pk, origin_point, destination_point, distance)`` rows, with
+    no ORM objects to build."""
+    return db.session.query(
+        Route.pk, Route.origin_point, Route.destination_point, Route.distance
+    )
+
+
+def load_routes():
+    return query_routes().all()
+
+
+def load_route(pk):
+    """The route row of :func:`query_routes`, plus its ``updated_at``."""
+    return query_routes().add_columns(Route.updated_at).filter(Route.pk == pk).first()
+
+
+class StaleRoute(Exception):
+    """The route was changed since the version the client sent."""
+
+
+# columns the write statements return, like :func:`load_route`
+ROUTE_COLUMNS = (
+    Route.__table__.c.pk,
+    Route.__table__.c.origin_point,
+    Route.__table__.c.destination_point,
+    Route.__table__.c.distance,
+    Route.__table__.c.updated_at,
+)
+
+
+def route_etag(updated_at):
+    """Entity tag of a route version, ``None`` without ``updated_at``."""
+    return None if updated_at is None else updated_at.isoformat()
+
+
+def has_returning():
+    # SQLite has RETURNING from 3.35 on, but SQLAlchemy only emits it there
+    # from 2.0 on
+    return db.session.get_bind().dialect.full_returning
+
+
+def insert_route(values):
+    """Insert a route and return its row, like :func:`load_route`."""
+    statement = sqlalchemy.insert(Route.__table__).values(**values)
+    if has_returning():
+        return db.session.execute(statement.returning(*ROUTE_COLUMNS)).first()
+
+    result = db.session.execute(statement)
+    return load_route(result.inserted_primary_key[0])
+
+
+def lock_route(pk, if_match):
+    """Take the write lock of route ``pk`` and return its row, or ``None``
+    when there is no such route; for databases without RETURNING.
+
+    Raises :class:`StaleRoute` when ``if_match`` does not match its version.
+    """
+    result = db.session.execute(
+        sqlalchemy.update(Route.__table__)
+        .where(Route.__table__.c.pk == pk)
+        .values(pk=Route.__table__.c.pk)
+    )
+    if not result.rowcount:
+        return None
+
+    row = load_route(pk)
+    if not if_match.contains(route_etag(row.updated_at)):
+        raise StaleRoute(pk)
+    return row
+
+
+def version_filter(statement, pk, if_match):
+    """``statement`` restricted to route ``pk`` at one of the versions in
+    ``if_match``, a :class:`werkzeug.datastructures.ETags`."""
+    statement = statement.where(Route.__table__.c.pk == pk)
+    if not if_match or if_match.star_tag:
+        return statement
+
+    versions = []
+    for etag in if_match.as_set():
+        try:
+            versions.append(datetime.datetime.fromisoformat(etag))
+        except ValueError:
+            pass
+    return statement.where(Route.__table__.c.updated_at.in_(versions))
+
+
+def write_route(statement, pk, if_match):
+    """Run an update or delete of route ``pk`` with RETURNING and return the
+    row, or ``None`` when there is no such route.
+
+    With ``if_match``, the route is only written at one of those versions,
+    or :class:`StaleRoute` is raised.
+    """
+    statement = version_filter(statement, pk, if_match)
+    row = db.session.execute(statement.returning(*ROUTE_COLUMNS)).first()
+    if row is None and if_match and load_route(pk) is not None:
+        raise StaleRoute(pk)
+    return row
+
+
+def update_route(pk, values, if_match=None):
+    """Update the given columns of route ``pk``, bump its ``updated_at``
+    and return its new row, or ``None`` when there is no such route.
+
+    Raises :class:`StaleRoute` when ``if_match`` does not match its version.
+    """
+    statement = sqlalchemy.update(Route.__table__).values(
+        updated_at=new_version(), **values
+    )
+    if has_returning():
+        return write_route(statement, pk, if_match)
+
+    if if_match and lock_route(pk, if_match) is None:
+        return None
+    result = db.session.execute(statement.where(Route.__table__.c.pk == pk))
+    if not result.rowcount:
+        return None
+    return load_route(pk)
+
+
+def delete_route(pk, if_match=None):
+    """Delete route ``pk`` and return its last row, or ``None`` when there is
+    no such route.
+
+    Raises :class:`StaleRoute` when ``if_match`` does not match its version.
+    """
+    if has_returning():
+        return write_route(sqlalchemy.delete(Route.__table__), pk, if_match)
+
+    row = lock_route(pk, if_match) if if_match else load_route(pk)
+    if row is not None:
+        db.session.execute(
+            sqlalchemy.delete(Route.__table__).where(Route.__table__.c.pk == pk)
+        )
+    return row
+
+
+def load_coordinates():
+    return db.session.query(Point.name, Point.latitude, Point.longitude).all()
+
+
+def load_revision():
+    return db.session.query(db.func.max(RouteRevision.pk)).scalar() or 0
+
+
+def load_changes(since):
+    return (
+        db.session.query(
+            RouteRevision.pk,
+            RouteRevision.action,
+            RouteRevision.route_pk,
+            RouteRevision.origin_point,
+            RouteRevision.destination_point,
+            RouteRevision.distance,
+        )
+        .filter(RouteRevision.pk > since)
+        .order_by(RouteRevision.pk)
+        .all()
+    )
+
+
+routing_graph = RoutingGraph(
+    load_routes,
+    load_coordinates,
+    load_revision,
+    load_changes,
+    app.config["GRAPH_SYNC_INTERVAL"],
+    app.config["REVISION_RETENTION"],
+)
+path_cache = PathCache(app.config["PATH_CACHE_SIZE"])
+hierarchy_file = FileCache(ContractionHierarchy.load)
+snapshot_file = FileCache(CSRGraph.load)
+# newest revision of the change feed, polled like the feed itself and again
+# after every local write
+feed_revision = PolledValue(load_revision, app.config["GRAPH_SYNC_INTERVAL"])
+
+
+def distances_csr_graph(distances):
+    return CSRGraph.from_edges(
+        (origin, destination, distance)
+        for (origin, destination), distance in distances.items()
+    )
+
+
+def build_all_pairs(distances):
+    graph = distances_csr_graph(distances)
+    if len(graph) > app.config["ALL_PAIRS_MAX_NODES"]:
+        return None
+    if not app.config["PARALLEL_WORKERS"]:
+        return AllPairs.build(graph)
+    with SearchPool(graph, app.config["PARALLEL_WORKERS"]) as pool:
+        return AllPairs.build(graph, pool)
+
+
+def start_search_pool(distances):
+    return SearchPool(distances_csr_graph(distances), app.config["PARALLEL_WORKERS"])
+
+
+all_pairs = BackgroundBuild(build_all_pairs)
+search_pools = PoolCache(start_search_pool)
+
+
+def load_csr_graph():
+    query = db.session.query(
+        Route.origin_point, Route.destination_point, Route.distance
+    )
+    return CSRGraph.from_edges(query.yield_per(10000))
+
+
+def get_all_pairs(graph):
+    """The all-pairs table of ``graph`` when it has at most
+    ``ALL_PAIRS_MAX_NODES`` points and the table is up to date."""
+    # ``nodes`` only holds origins, so this is a first, cheap filter
+    if len(graph.nodes) > app.config["ALL_PAIRS_MAX_NODES"]:
+        return None
+    return all_pairs.get(graph, routing_graph.graph_generation)
+
+
+def get_search_pool(graph, origins):
+    """The process pool over ``graph``, when parallel searches are enabled
+    and there are at least ``PARALLEL_MIN_ORIGINS`` ``origins``."""
+    if not app.config["PARALLEL_WORKERS"]:
+        return None
+    if len(origins) < app.config["PARALLEL_MIN_ORIGINS"]:
+        return None
+    return search_pools.get(graph, routing_graph.graph_generation)
+
+
+def get_routing_graph():
+    with metrics.span("graph"):
+        return routing_graph.get()
+
+
+def get_snapshot():
+    """The CSR snapshot, when the "csr" engine is configured and the
+    snapshot was built at the newest revision of the change feed.
+
+    Workers then search and validate points on the mapped snapshot alone,
+    without building a graph of their own.
+    """
+    if app.config["ROUTING_ENGINE"] != "csr":
+        return None
+    with metrics.span("graph"):
+        snapshot = snapshot_file.get(app.config["SNAPSHOT_PATH"])
+        if snapshot is None:
+            return None
+        if snapshot.revision != feed_revision.get(routing_graph.generation):
+            return None
+    return snapshot
+
+
+def get_point_index():
+    """What ``has_origin`` and ``has_destination`` are asked: the snapshot
+    the "csr" engine searches, or else the routing graph."""
+    snapshot = get_snapshot()
+    return routing_graph if snapshot is None else snapshot
+
 
 def calculate_shortest_path(origin, destination):
-    graph = Graph()
-    routes = Route.query.all()
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        key = (origin, destination, "csr", snapshot.revision)
+        result = path_cache.get(key)
+        if result is None:
+            stats = metrics.search_stats()
+            try:
+                with metrics.span("search"):
+                    result = get_csr_shortest_path(snapshot, origin, destination, stats)
+            finally:
+                metrics.count_search(stats, "csr")
+            path_cache.set(key, result)
+        return result
+
+    graph = get_routing_graph()
+    table = get_all_pairs(graph)
+    if table is not None:
+        metrics.count_search(metrics.search_stats(), "table")
+        with metrics.span("table"):
+            return table.shortest_path(origin, destination)
+
+    key = (origin, destination, routing_graph.graph_generation)
+
+    result = path_cache.get(key)
+    if result is None:
+        with metrics.span("search"):
+            result = find_shortest_path(graph, origin, destination)
+        path_cache.set(key, result)
+
+    return result
+
+
+def calculate_k_shortest_paths(origin, destination, k):
+    graph = get_routing_graph()
+    key = (origin, destination, k, routing_graph.graph_generation)
+
+    result = path_cache.get(key)
+    if result is None:
+        stats = metrics.search_stats()
+        with metrics.span("search"):
+            result = k_shortest_paths(graph, origin, destination, k, stats)
+        metrics.count_search(stats, "yen")
+        path_cache.set(key, result)
+
+    return result
+
+
+def find_shortest_path(graph, origin, destination):
+    engine = app.config["ROUTING_ENGINE"]
+
+    stats = metrics.search_stats()
+    if engine == "ch":
+        # the hierarchy is only used until the next route write
+        hierarchy = hierarchy_file.get(app.config["CH_PATH"])
+        if hierarchy is not None and hierarchy.revision == feed_revision.get(
+            routing_graph.generation
+        ):
+            try:
+                return hierarchy.shortest_path(origin, destination, stats)
+            finally:
+                metrics.count_search(stats, "ch")
+        engine = "dijkstra"
+    elif engine == "csr":
+        # the snapshot is behind the routes, see get_snapshot
+        engine = "dijkstra"
+
+    try:
+        return get_shortest_path(graph, origin, destination, engine, stats)
+    finally:
+        metrics.count_search(stats, engine)
+
+
+def build_hierarchy(path):
+    """Contract the network in the ``routes`` table and store it at ``path``."""
+    # read before the routes, like build_snapshot
+    revision = load_revision()
+    hierarchy = ContractionHierarchy.build(routing_graph.build(load_routes()))
+    hierarchy.revision = revision
+    hierarchy.save(path)
+
+    return hierarchy
+
+
+def build_snapshot(path):
+    """Write the network in the ``routes`` table to a CSR snapshot at
+    ``path``, keeping the shortest of parallel routes."""
+    # read before the routes: a write committed in between makes the
+    # snapshot look stale, never fresh
+    revision = load_revision()
+    graph = routing_graph.build(load_routes())
+    snapshot = CSRGraph.from_edges(
+        (origin, destination, distance)
+        for (origin, destination), distance in graph.distances.items()
+    )
+    snapshot.revision = revision
+    snapshot.save(path)
+
+    return snapshot
+
+
+def calculate_shortest_paths(origin, destinations):
+    """Distances and paths from ``origin`` to every reachable point of
+    ``destinations``, sharing one search tree."""
+    snapshot = get_snapshot()
+    stats = metrics.search_stats()
+    if snapshot is not None:
+        with metrics.span("search"):
+            result = csr_shortest_paths(snapshot, origin, destinations, stats)
+        metrics.count_search(stats, "csr")
+        return result
+
+    graph = get_routing_graph()
+    table = get_all_pairs(graph)
+    if table is not None:
+        metrics.count_search(stats, "table")
+        with metrics.span("table"):
+            return table.shortest_paths(origin, destinations)
+
+    with metrics.span("search"):
+        visited, paths = heap_dijkstra(graph, origin, stats=stats)
+    metrics.count_search(stats, "dijkstra")
+
+    return {
+        destination: (visited[destination], build_path(paths, origin, destination))
+        for destination in destinations
+        if destination in paths
+    }
+
+
+def calculate_shortest_path_trees(destinations):
+    """:func:`calculate_shortest_paths` for each ``origin: points`` item of
+    ``destinations``, over the process pool when it is worth it."""
+    origins = list(destinations)
+    pool = None
+    if get_snapshot() is None:
+        graph = get_routing_graph()
+        pool = None if get_all_pairs(graph) else get_search_pool(graph, origins)
+    if pool is None:
+        return {
+            origin: calculate_shortest_paths(origin, destinations[origin])
+            for origin in origins
+        }
+
+    # the worker processes search the CSR form and report no counts
+    metrics.count_search(metrics.search_stats(), "csr", len(origins))
+    trees = pool.shortest_paths(origins, [destinations[origin] for origin in origins])
+    return dict(zip(origins, trees))
+
+
+def calculate_distance_rows(origins, destinations):
+    """Yield :func:`calculate_distance_row` for each of ``origins``, in
+    order, over the process pool when it is worth it."""
+    pool = None
+    if get_snapshot() is None:
+        graph = get_routing_graph()
+        pool = None if get_all_pairs(graph) else get_search_pool(graph, origins)
+    if pool is None:
+        for origin in origins:
+            yield calculate_distance_row(origin, destinations)
+        return
+
+    # the worker processes search the CSR form and report no counts
+    metrics.count_search(metrics.search_stats(), "csr", len(origins))
+    for row in pool.distance_rows(origins, destinations):
+        yield row
+
+
+def calculate_distance_row(origin, destinations):
+    """Distances from ``origin`` to each of ``destinations``, ``None`` where
+    unreachable, from a single search tree."""
+    snapshot = get_snapshot()
+    stats = metrics.search_stats()
+    if snapshot is not None:
+        with metrics.span("search"):
+            row = csr_distance_row(snapshot, origin, destinations, stats)
+        metrics.count_search(stats, "csr")
+        return row
+
+    graph = get_routing_graph()
+    table = get_all_pairs(graph)
+    if table is not None:
+        metrics.count_search(stats, "table")
+        with metrics.span("table"):
+            return table.distance_row(origin, destinations)
+
+    with metrics.span("search"):
+        visited, _ = heap_dijkstra(graph, origin, stats=stats)
+    metrics.count_search(stats, "dijkstra")
 
-    for route in routes:
-        graph.add_node(route.origin_point)
+    return [visited.get(destination) for destination in destinations]
 
-    for route in routes:
-        graph.add_edge(route.origin_point, route.destination_point, route.distance)
 
-    return get_shortest_path(graph, origin, destination)
+def calculate_costs(distances, autonomy, fuel_price):
+    """:func:`calculate_cost` applied across a row of distances."""
+    return [
+        None if distance is None else distance * fuel_price / autonomy
+        for distance in distances
+    ]
 
 
 def calculate_cost(distance, autonomy, fuel_price):
@@ -1,40 +1,140 @@
+import codecs
+
 import sqlalchemy
-from flask import abort
-from flask_restful import Resource, fields, marshal, reqparse
-
-from app import db
-from app.fields import float_field, integer_field
-from app.models import Route
-
-route_fields = {
-    "origin_point": fields.String,
-    "destination_point": fields.String,
-    "distance": fields.Integer,
-    "uri": fields.Url("route"),
+from flask import Response, abort, request, stream_with_context, url_for
+from flask_restful import Resource, fields, marshal
+
+from app import app, db
+from app.calculations import (
+    batch_schema,
+    calculate_cost,
+    calculate_cost_batch,
+    calculate_cost_matrix,
+    cost_schema,
+    matrix_schema,
+)
+from app.fields import (
+    integer_field,
+    job_kind_field,
+    positive_integer_field,
+    stream_field,
+)
+from app.importer import MIMETYPES, READERS, import_routes
+from app.jobs import job_queue, submit_job
+from app.metrics import metrics
+from app.models import (
+    Job,
+    Route,
+    RouteRevision,
+    StaleRoute,
+    delete_route,
+    insert_route,
+    load_route,
+    path_cache,
+    query_routes,
+    route_etag,
+    routing_graph,
+    update_route,
+)
+from app.schema import Field, Schema
+from app.serializers import route_serializer
+
+job_fields = {
+    "kind": fields.String,
+    "status": fields.String,
+    "uri": fields.Url("job"),
+    "result": fields.Url("job_result"),
 }
 
+# request schemas are built once, at import, and shared by all requests
+route_schema = Schema(
+    Field("origin_point", str, required=True),
+    Field("destination_point", str, required=True),
+    Field("distance", integer_field, required=True),
+)
 
-class RoutesAPI(Resource):
-    def __init__(self):
-        self.reqparse = reqparse.RequestParser()
-        self.reqparse.add_argument(
-            "origin_point", type=str, required=True, location="json"
-        )
-        self.reqparse.add_argument(
-            "destination_point", type=str, required=True, location="json"
-        )
-        self.reqparse.add_argument(
-            "distance", type=integer_field, required=True, location="json"
-        )
+route_list_schema = Schema(
+    Field("limit", positive_integer_field, location="args"),
+    Field("after", positive_integer_field, location="args"),
+    Field("stream", stream_field, location="args"),
+)
+
+route_update_schema = Schema(
+    Field("origin_point", str),
+    Field("destination_point", str),
+    Field("distance", integer_field),
+)
+
+job_schema = Schema(
+    Field("kind", job_kind_field, required=True),
+    Field("params", dict, required=True),
+)
 
-        super(RoutesAPI, self).__init__()
 
+def route_response(row, status=200):
+    """Response with the route of ``row`` and its version as the ETag."""
+    response = route_serializer.route(row, status)
+    etag = route_etag(row.updated_at)
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def stale_route(pk):
+    return {"error": "Route %d has changed." % pk}, 412
+
+
+class RoutesAPI(Resource):
     def get(self):
-        routes = Route.query.all()
-        return {"routes": [marshal(route, route_fields) for route in routes]}
+        args = route_list_schema.parse()
+        limit = args.get("limit")
+        after = args.get("after")
+
+        if limit is None and after is None and args.get("stream") is None:
+            return route_serializer.routes(query_routes().all())
+
+        # keyset pagination: pages are ranges of the primary key
+        query = query_routes().order_by(Route.pk)
+        if after is not None:
+            query = query.filter(Route.pk > after)
+        if limit is not None:
+            query = query.limit(limit)
+
+        if args.get("stream") is not None:
+            return self.stream(query.yield_per(1000), args.get("stream"))
+
+        routes = query.all()
+        next_page = None
+        if len(routes) == limit:
+            next_page = url_for("routes", limit=limit, after=routes[-1].pk)
+
+        return route_serializer.page(routes, next_page)
+
+    def stream(self, routes, stream):
+        """Stream ``routes`` as NDJSON or as a chunked JSON document, holding
+        only one batch of rows in memory."""
+
+        def generate_ndjson():
+            for route in route_serializer.encode(routes):
+                yield route + "\n"
+
+        def generate_json():
+            yield '{"routes": ['
+            separator = ""
+            for route in route_serializer.encode(routes):
+                yield separator + route
+                separator = ", "
+            yield "]}\n"
+
+        if stream == "ndjson":
+            generate, mimetype = generate_ndjson, "application/x-ndjson"
+        else:
+            generate, mimetype = generate_json, "application/json"
+
+        return Response(stream_with_context(generate()), mimetype=mimetype)
 
     def post(self):
-        args = self.reqparse.parse_args()
+        args = route_schema.parse()
         route = {
             "origin_point": args.get("origin_point"),
             "destination_point": args.get("destination_point"),
@@ -42,94 +142,145 @@ class RoutesAPI(Resource):
         }
 
         try:
-            route_object = Route(**route)
-            db.session.add(route_object)
+            # the stored row comes back from the insert itself
+            row = insert_route(route)
+            revision = RouteRevision.record("insert", row)
             db.session.commit()
         except sqlalchemy.exc.IntegrityError as e:
+            db.session.rollback()
             return {"error": "Route already exists."}, 400
 
-        return {"route": marshal(Route.query.get(route_object.pk), route_fields)}, 201
+        routing_graph.add_route(
+            row.pk, row.origin_point, row.destination_point, row.distance, revision
+        )
 
+        return route_response(row, 201)
 
-class RouteAPI(Resource):
-    def __init__(self):
-        self.reqparse = reqparse.RequestParser()
-        self.reqparse.add_argument("origin_point", type=str, location="json")
-        self.reqparse.add_argument("destination_point", type=str, location="json")
-        self.reqparse.add_argument("distance", type=integer_field, location="json")
 
-        super(RouteAPI, self).__init__()
+class RoutesImportAPI(Resource):
+    def post(self):
+        format = MIMETYPES.get(request.mimetype)
+        if format is None:
+            return {
+                "error": "Unsupported content type '%s', use one of: %s."
+                % (request.mimetype, ", ".join(sorted(MIMETYPES)))
+            }, 415
+
+        lines = codecs.iterdecode(request.stream, "utf-8")
+        return import_routes(READERS[format](lines), app.config["IMPORT_BATCH_SIZE"])
+
 
+class RouteAPI(Resource):
     def get(self, pk):
-        route = Route.query.get(pk)
+        route = load_route(pk)
         if route is None:
             abort(404)
-        return {"route": marshal(route, route_fields)}
+        return route_response(route)
 
     def put(self, pk):
-        route = Route.query.get(pk)
-        if route is None:
-            abort(404)
-
-        args = self.reqparse.parse_args()
-
-        if args.get("destination_point") is not None:
-            route.destination_point = args.get("destination_point")
-
-        if args.get("origin_point") is not None:
-            route.origin_point = args.get("origin_point")
+        args = route_update_schema.parse()
+        values = {
+            name: args.get(name)
+            for name in ("origin_point", "destination_point", "distance")
+            if args.get(name) is not None
+        }
 
-        if args.get("distance") is not None:
-            route.distance = args.get("distance")
+        # one statement writes the route, with If-Match, and returns its row
+        try:
+            row = update_route(pk, values, request.if_match)
+        except StaleRoute:
+            db.session.rollback()
+            return stale_route(pk)
+        if row is None:
+            db.session.rollback()
+            abort(404)
 
+        revision = RouteRevision.record("update", row)
         db.session.commit()
+        routing_graph.update_route(
+            pk, row.origin_point, row.destination_point, row.distance, revision
+        )
 
-        return {"route": marshal(Route.query.get(pk), route_fields)}
+        return route_response(row)
 
     def delete(self, pk):
-        route = Route.query.get(pk)
-        if route is None:
+        try:
+            row = delete_route(pk, request.if_match)
+        except StaleRoute:
+            db.session.rollback()
+            return stale_route(pk)
+        if row is None:
+            db.session.rollback()
             abort(404)
-        db.session.delete(route)
+
+        revision = RouteRevision.record("delete", row)
         db.session.commit()
+        routing_graph.remove_route(pk, revision)
         return {"result": True}
 
 
 class RouteCalculateCostAPI(Resource):
-    def __init__(self):
-        self.reqparse = reqparse.RequestParser()
-        self.reqparse.add_argument(
-            "origin_point", type=str, required=True, location="json"
-        )
-        self.reqparse.add_argument(
-            "destination_point", type=str, required=True, location="json"
-        )
-        self.reqparse.add_argument(
-            "autonomy", type=integer_field, required=True, location="json"
-        )
-        self.reqparse.add_argument(
-            "fuel_price", type=float_field, required=True, location="json"
-        )
+    def post(self):
+        with metrics.span("parse"):
+            args = cost_schema.parse()
+        return calculate_cost(args)
+
+
+class RouteCalculateCostCacheAPI(Resource):
+    def get(self):
+        return {"cache": path_cache.stats()}
 
-        super(RouteCalculateCostAPI, self).__init__()
 
+class RouteBatchCalculateCostAPI(Resource):
     def post(self):
-        args = self.reqparse.parse_args()
-        origin_point = args.get("origin_point")
-        destination_point = args.get("destination_point")
-        autonomy = args.get("autonomy")
-        fuel_price = args.get("fuel_price")
+        return calculate_cost_batch(batch_schema.parse())
 
-        # validate origin point and destination point
-        if Route.query.filter_by(origin_point=origin_point).count() == 0:
-            return {"error": "Origin point '%s' not found" % origin_point}, 400
 
-        if Route.query.filter_by(destination_point=destination_point).count() == 0:
-            return {
-                "error": "Destination point '%s' not found" % destination_point
-            }, 400
+class RouteCostMatrixAPI(Resource):
+    def post(self):
+        body, status = calculate_cost_matrix(matrix_schema.parse())
+        if status != 200:
+            return body, status
+
+        # rows are sent as they are computed, in order, to keep memory bounded
+        return Response(stream_with_context(body), mimetype="application/json")
+
 
-        cost, path = Route.calculate(
-            origin_point, destination_point, autonomy, fuel_price
+class JobsAPI(Resource):
+    def post(self):
+        args = job_schema.parse()
+        job = submit_job(args.get("kind"), args.get("params"))
+
+        return (
+            {"job": marshal(job, job_fields)},
+            202,
+            {"Location": url_for("job", pk=job.pk)},
         )
-        return {"cost": cost, "path": path}
+
+
+class JobAPI(Resource):
+    def get(self, pk):
+        # a job polled after a restart is queued again, see JobQueue
+        job_queue.start()
+        job = Job.query.get(pk)
+        if job is None:
+            return {"error": "Job not found"}, 404
+        return {"job": marshal(job, job_fields)}
+
+
+class JobResultAPI(Resource):
+    def get(self, pk):
+        job_queue.start()
+        job = Job.query.get(pk)
+        if job is None:
+            return {"error": "Job not found"}, 404
+        if job.result is None:
+            return {"error": "Job %d is still %s" % (pk, job.status)}, 409
+
+        # the stored body is sent as the endpoint returned it
+        return Response(job.result, job.status_code, mimetype="application/json")
+
+
+class MetricsAPI(Resource):
+    def get(self):
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
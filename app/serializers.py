@@ -0,0 +1,113 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+from flask import Response, current_app, request
+
+from app import app
+
+
+class RouteSerializer(object):
+    """Writes route rows, ``(pk, origin_point, destination_point,
+    distance)`` tuples from :func:`app.models.query_routes`, as the same
+    JSON that marshalling routes with Flask-RESTful's ``fields`` and
+    ``output_json`` produced.
+
+    Each row is formatted into a template with the C string encoder that
+    ``json.dumps`` uses, and the ``uri`` comes from the route's URL rule,
+    read once, instead of a ``url_for`` call per row. In debug mode, or
+    with a ``RESTFUL_JSON`` setting, dicts go through ``json.dumps`` to
+    keep ``output_json``'s formatting.
+    """
+
+    def __init__(self, endpoint="route"):
+        self.endpoint = endpoint
+        self._rule = None
+
+    @property
+    def rule(self):
+        """The parts of the route's URL rule around its ``pk``."""
+        if self._rule is None:
+            rule = next(app.url_map.iter_rules(self.endpoint)).rule
+            prefix, _, rest = rule.partition("<int:pk>")
+            self._rule = (prefix, rest)
+        return self._rule
+
+    def uri(self, pk):
+        prefix, suffix = self.rule
+        return "{}{}{}{}".format(request.script_root, prefix, pk, suffix)
+
+    def template(self):
+        prefix, suffix = self.rule
+        prefix = encode_basestring_ascii(request.script_root + prefix)[:-1]
+        suffix = encode_basestring_ascii(suffix)[1:]
+        return (
+            '{"origin_point": %s, "destination_point": %s, "distance": %d, "uri": '
+            + prefix.replace("%", "%%")
+            + "%d"
+            + suffix.replace("%", "%%")
+            + "}"
+        )
+
+    def encode(self, rows):
+        """Yield each row as a JSON object, as ``json.dumps`` writes it."""
+        template = self.template()
+        for pk, origin, destination, distance in rows:
+            yield template % (
+                encode_basestring_ascii(origin),
+                encode_basestring_ascii(destination),
+                distance,
+                pk,
+            )
+
+    def to_dict(self, row):
+        pk, origin, destination, distance = row
+        return {
+            "origin_point": origin,
+            "destination_point": destination,
+            "distance": distance,
+            "uri": self.uri(pk),
+        }
+
+    def respond(self, fast, data, status=200):
+        """Response with the text of ``fast()``, or of ``json.dumps(data())``
+        where ``output_json`` would format it differently."""
+        settings = current_app.config.get("RESTFUL_JSON", {})
+        if current_app.debug or settings:
+            settings = dict(settings)
+            if current_app.debug:
+                settings.setdefault("indent", 4)
+            text = json.dumps(data(), **settings)
+        else:
+            text = fast()
+        return Response(text + "\n", status, mimetype="application/json")
+
+    def route(self, row, status=200):
+        """Response with ``{"route": ...}``; columns of ``row`` after the
+        first four, like ``updated_at``, are left out."""
+        row = tuple(row)[:4]
+        return self.respond(
+            lambda: '{"route": %s}' % next(self.encode([row])),
+            lambda: {"route": self.to_dict(row)},
+            status,
+        )
+
+    def routes(self, rows):
+        """Response with ``{"routes": [...]}``."""
+        return self.respond(
+            lambda: '{"routes": [%s]}' % ", ".join(self.encode(rows)),
+            lambda: {"routes": [self.to_dict(row) for row in rows]},
+        )
+
+    def page(self, rows, next_page):
+        """Response with ``{"routes": [...], "next": ...}``."""
+        return self.respond(
+            lambda: '{"routes": [%s], "next": %s}'
+            % (", ".join(self.encode(rows)), json.dumps(next_page)),
+            lambda: {
+                "routes": [self.to_dict(row) for row in rows],
+                "next": next_page,
+            },
+        )
+
+
+route_serializer = RouteSerializer()
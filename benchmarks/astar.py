@@ -0,0 +1,67 @@
+"""
+    A* Benchmark
+    ~~~~~~~~~~~~
+
+    Compares nodes expanded and latency of A* with plain Dijkstra on
+    random geometric networks.
+
+    Usage::
+
+        python -m benchmarks.astar --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import time
+
+from app.dijkstra import astar, euclidean, heap_shortest_path
+from benchmarks.graphs import build_graph, geometric_network
+
+
+def run(engine, graph, pairs):
+    stats = {}
+    start = time.perf_counter()
+    for origin, destination in pairs:
+        try:
+            engine(graph, origin, destination, stats=stats)
+        except KeyError:
+            pass
+    return (time.perf_counter() - start) / len(pairs), stats["settled"] / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def euclidean_astar(graph, origin, destination, stats):
+        return astar(graph, origin, destination, euclidean, stats)
+
+    print(
+        "{:>8} {:>14} {:>14} {:>14} {:>14}".format(
+            "points", "dijkstra (s)", "expanded", "astar (s)", "expanded"
+        )
+    )
+
+    for size in args.sizes:
+        graph = build_graph(*geometric_network(size, seed=args.seed))
+        rng = random.Random(args.seed)
+        pairs = [
+            ("P{}".format(rng.randrange(size)), "P{}".format(rng.randrange(size)))
+            for _ in range(args.queries)
+        ]
+
+        dijkstra_time, dijkstra_expanded = run(heap_shortest_path, graph, pairs)
+        astar_time, astar_expanded = run(euclidean_astar, graph, pairs)
+
+        print(
+            "{:>8} {:14.4f} {:14.0f} {:14.4f} {:14.0f}".format(
+                size, dijkstra_time, dijkstra_expanded, astar_time, astar_expanded
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
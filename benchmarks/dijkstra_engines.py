@@ -0,0 +1,70 @@
+"""
+    Dijkstra Engines Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the linear-scan ``dijkstra`` with the heap-based engine.
+
+    Usage::
+
+        python -m benchmarks.dijkstra_engines --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import time
+
+from app.dijkstra import dijkstra, heap_dijkstra
+from benchmarks.graphs import build_graph, random_edges
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument(
+        "--linear-limit",
+        type=int,
+        default=10000,
+        help="skip the O(V^2) engine above this many points",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        "{:>8} {:>14} {:>14} {:>14}".format(
+            "points", "linear (s)", "heap (s)", "heap+exit (s)"
+        )
+    )
+
+    for size in args.sizes:
+        graph = build_graph(random_edges(size, seed=args.seed))
+        rng = random.Random(args.seed)
+        pairs = [
+            ("P{}".format(rng.randrange(size)), "P{}".format(rng.randrange(size)))
+            for _ in range(args.queries)
+        ]
+
+        if size <= args.linear_limit:
+            linear = sum(measure(dijkstra, graph, origin) for origin, _ in pairs)
+            linear = "{:14.4f}".format(linear / len(pairs))
+        else:
+            linear = "{:>14}".format("skipped")
+
+        heap = sum(measure(heap_dijkstra, graph, origin) for origin, _ in pairs)
+        early = sum(measure(heap_dijkstra, graph, o, d) for o, d in pairs)
+
+        print(
+            "{:>8} {} {:14.4f} {:14.4f}".format(
+                size, linear, heap / len(pairs), early / len(pairs)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
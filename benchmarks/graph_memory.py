@@ -0,0 +1,71 @@
+"""
+    Graph Memory Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the memory held by ``Graph`` and ``CSRGraph`` for the same
+    network, and by a ``CSRGraph`` mapped from a snapshot file, whose
+    arrays live in the page cache shared by every worker. ``Graph`` is
+    measured with the routes keyed by their pair of points, and by primary
+    key, as workers build it from the ``routes`` table.
+
+    Usage::
+
+        python -m benchmarks.graph_memory --edges 1000000
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+from app.cache import RoutingGraph
+from app.dijkstra.csr import CSRGraph
+from benchmarks.graphs import build_graph, random_edges
+
+
+def build_keyed_graph(edges):
+    rows = ((pk, o, d, distance) for pk, (o, d, distance) in enumerate(edges, 1))
+    return RoutingGraph(None).build(rows)
+
+
+def measure(build, edges):
+    gc.collect()
+    tracemalloc.start()
+    graph = build(edges)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del graph
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--edges", type=int, default=1000000)
+    parser.add_argument("--degree", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    edges = list(random_edges(args.edges // args.degree, args.degree, seed=args.seed))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "routes.snapshot")
+        CSRGraph.from_edges(edges).save(path)
+
+        for name, build in (
+            ("Graph", build_graph),
+            ("Graph/pk", build_keyed_graph),
+            ("CSRGraph", CSRGraph.from_edges),
+            ("snapshot", lambda edges: CSRGraph.load(path)),
+        ):
+            size = measure(build, edges)
+            print(
+                "{:>10} {:10.1f} MiB {:8.1f} bytes/edge".format(
+                    name, size / 2**20, size / len(edges)
+                )
+            )
+        print("{:>10} {:10.1f} MiB on disk".format("", os.path.getsize(path) / 2**20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+    Synthetic Networks
+    ~~~~~~~~~~~~~~~~~~
+
+    Seeded generators for benchmark graphs, and a loader that writes them
+    to the ``routes`` and ``points`` tables.
+"""
+
+import math
+import random
+from collections import defaultdict
+
+from app import db
+from app.dijkstra import Graph
+from app.models import Point, Route, routing_graph
+
+
+def random_edges(size, degree=4, max_distance=100, seed=0):
+    """Yield ``(origin, destination, distance)`` triples for a random
+    network of ``size`` points, each with ``degree`` outgoing routes.
+
+    A ring through every point keeps the network strongly connected.
+    """
+    rng = random.Random(seed)
+    names = ["P{}".format(i) for i in range(size)]
+
+    for i, origin in enumerate(names):
+        yield origin, names[(i + 1) % size], rng.randint(1, max_distance)
+        for _ in range(degree - 1):
+            yield origin, names[rng.randrange(size)], rng.randint(1, max_distance)
+
+
+def geometric_network(size, degree=3, scale=1000, seed=0):
+    """Random geometric network: ``size`` points scattered over a square of
+    side ``scale``, each with two-way routes to its ``degree`` nearest
+    points.
+
+    Returns ``(edges, coordinates)``. Distances are straight-line lengths
+    rounded up, so a Euclidean heuristic is admissible.
+    """
+    rng = random.Random(seed)
+    names = ["P{}".format(i) for i in range(size)]
+    coordinates = {name: (rng.random() * scale, rng.random() * scale) for name in names}
+
+    # bucket points into cells holding about ``degree`` points each
+    cell = scale * math.sqrt(degree / size)
+    cells = defaultdict(list)
+    for name, (x, y) in coordinates.items():
+        cells[(int(x // cell), int(y // cell))].append(name)
+
+    routes = {}
+    for (i, j), members in cells.items():
+        neighbours = [
+            other
+            for di in (-1, 0, 1)
+            for dj in (-1, 0, 1)
+            for other in cells.get((i + di, j + dj), ())
+        ]
+        for origin in members:
+            nearest = sorted(
+                (math.dist(coordinates[origin], coordinates[other]), other)
+                for other in neighbours
+                if other != origin
+            )
+            for straight, destination in nearest[:degree]:
+                distance = max(math.ceil(straight), 1)
+                routes[(origin, destination)] = distance
+                routes[(destination, origin)] = distance
+
+    edges = [
+        (origin, destination, distance)
+        for (origin, destination), distance in routes.items()
+    ]
+
+    return edges, coordinates
+
+
+def grid_network(size, spacing=100, seed=0):
+    """Street grid of about ``size`` points ``spacing`` apart, with two-way
+    routes between neighbours.
+
+    Returns ``(edges, coordinates)``. Each route is up to 50% longer than
+    the straight line, like a road, and one in ten is missing, so there are
+    detours.
+    """
+    rng = random.Random(seed)
+    side = max(math.isqrt(size), 2)
+
+    def name(i, j):
+        return "P{}".format(i * side + j)
+
+    coordinates = {
+        name(i, j): (j * spacing, i * spacing) for i in range(side) for j in range(side)
+    }
+
+    edges = []
+    for i in range(side):
+        for j in range(side):
+            for ni, nj in ((i + 1, j), (i, j + 1)):
+                if ni >= side or nj >= side or rng.random() < 0.1:
+                    continue
+                distance = spacing + rng.randrange(spacing // 2 + 1)
+                edges.append((name(i, j), name(ni, nj), distance))
+                edges.append((name(ni, nj), name(i, j), distance))
+
+    return edges, coordinates
+
+
+def scale_free_network(size, degree=2, max_distance=100, seed=0):
+    """Scale-free network grown by preferential attachment (Barabási-Albert):
+    each new point gets two-way routes to ``degree`` points picked with
+    probability proportional to their number of routes.
+
+    Returns ``(edges, coordinates)``, with no coordinates.
+    """
+    rng = random.Random(seed)
+    names = ["P{}".format(i) for i in range(size)]
+
+    routes = {}
+    # every point appears once per route end, to pick by degree
+    ends = names[: degree + 1]
+    for i in range(degree + 1, size):
+        targets = set()
+        while len(targets) < degree:
+            targets.add(rng.choice(ends))
+        for target in targets:
+            distance = rng.randint(1, max_distance)
+            routes[(names[i], target)] = distance
+            routes[(target, names[i])] = distance
+            ends.extend((names[i], target))
+
+    edges = [
+        (origin, destination, distance)
+        for (origin, destination), distance in routes.items()
+    ]
+
+    return edges, {}
+
+
+NETWORKS = {
+    "grid": grid_network,
+    "geometric": geometric_network,
+    "scale_free": scale_free_network,
+}
+
+
+def load_network(edges, coordinates=None, batch_size=10000):
+    """Replace the ``routes`` and ``points`` tables with a network."""
+    db.session.query(Route).delete()
+    db.session.query(Point).delete()
+
+    edges = list(edges)
+    for start in range(0, len(edges), batch_size):
+        db.session.execute(
+            Route.__table__.insert(),
+            [
+                {"origin_point": o, "destination_point": d, "distance": distance}
+                for o, d, distance in edges[start : start + batch_size]
+            ],
+        )
+
+    points = [
+        {"name": name, "latitude": x, "longitude": y}
+        for name, (x, y) in (coordinates or {}).items()
+    ]
+    for start in range(0, len(points), batch_size):
+        db.session.execute(Point.__table__.insert(), points[start : start + batch_size])
+
+    db.session.commit()
+    routing_graph.invalidate()
+
+
+def build_graph(edges, coordinates=None):
+    graph = Graph()
+
+    for origin, destination, distance in edges:
+        graph.add_node(origin)
+        graph.add_edge(origin, destination, distance)
+
+    for name, (x, y) in (coordinates or {}).items():
+        graph.set_coordinates(name, x, y)
+
+    return graph
@@ -0,0 +1,73 @@
+"""
+    Contraction Hierarchy Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Preprocessing time and query latency of the contraction hierarchy
+    against the heap Dijkstra engine on random geometric networks.
+
+    Usage::
+
+        python -m benchmarks.hierarchy --sizes 1000 10000
+"""
+
+import argparse
+import random
+import time
+
+from app.dijkstra import heap_shortest_path
+from app.dijkstra.ch import ContractionHierarchy
+from benchmarks.graphs import build_graph, geometric_network
+
+
+def run(engine, pairs):
+    start = time.perf_counter()
+    for origin, destination in pairs:
+        try:
+            engine(origin, destination)
+        except KeyError:
+            pass
+    return (time.perf_counter() - start) / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        "{:>8} {:>14} {:>14} {:>14}".format(
+            "points", "build (s)", "dijkstra (ms)", "ch (ms)"
+        )
+    )
+
+    for size in args.sizes:
+        edges, _ = geometric_network(size, seed=args.seed)
+        graph = build_graph(edges)
+
+        start = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(graph)
+        build = time.perf_counter() - start
+
+        rng = random.Random(args.seed)
+        pairs = [
+            ("P{}".format(rng.randrange(size)), "P{}".format(rng.randrange(size)))
+            for _ in range(args.queries)
+        ]
+
+        dijkstra_time = run(
+            lambda origin, destination: heap_shortest_path(graph, origin, destination),
+            pairs,
+        )
+        hierarchy_time = run(hierarchy.shortest_path, pairs)
+
+        print(
+            "{:>8} {:14.2f} {:14.3f} {:14.3f}".format(
+                size, build, dijkstra_time * 1000, hierarchy_time * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
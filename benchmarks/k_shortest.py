@@ -0,0 +1,68 @@
+"""
+    K-Shortest Paths Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the latency of ``k_shortest_paths`` with a single Dijkstra
+    query, to check that spur searches reuse the reverse tree.
+
+    Usage::
+
+        python -m benchmarks.k_shortest --sizes 1000 10000 100000 --k 5
+"""
+
+import argparse
+import random
+import time
+
+from app.dijkstra import heap_shortest_path
+from app.dijkstra.yen import k_shortest_paths
+from benchmarks.graphs import build_graph, geometric_network
+
+
+def run(engine, graph, pairs):
+    start = time.perf_counter()
+    for origin, destination in pairs:
+        try:
+            engine(graph, origin, destination)
+        except KeyError:
+            pass
+    return (time.perf_counter() - start) / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def k_paths(graph, origin, destination):
+        return k_shortest_paths(graph, origin, destination, args.k)
+
+    print(
+        "{:>8} {:>14} {:>14} {:>8}".format(
+            "points", "dijkstra (s)", "k={} (s)".format(args.k), "ratio"
+        )
+    )
+
+    for size in args.sizes:
+        graph = build_graph(*geometric_network(size, seed=args.seed))
+        rng = random.Random(args.seed)
+        pairs = [
+            ("P{}".format(rng.randrange(size)), "P{}".format(rng.randrange(size)))
+            for _ in range(args.queries)
+        ]
+
+        dijkstra_time = run(heap_shortest_path, graph, pairs)
+        k_time = run(k_paths, graph, pairs)
+
+        print(
+            "{:>8} {:14.4f} {:14.4f} {:8.2f}".format(
+                size, dijkstra_time, k_time, k_time / dijkstra_time
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
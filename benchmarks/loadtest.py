@@ -0,0 +1,352 @@
+"""
+    Load Test
+    ~~~~~~~~~
+
+    Drives the API with many concurrent keep-alive connections over a mix
+    of real requests, and reports the throughput and the p50/p95/p99
+    latency of each endpoint.
+
+    Unless ``--url`` points at a running server (gunicorn, say), the app
+    is served from a child process on a local port, against the database
+    of ``DB_URL``. A seeded street grid is imported through
+    ``/routes/import`` for the cost requests; the other requests create,
+    read, update and delete routes of their own.
+
+    SQLite works with a database file, not an in-memory one, which a
+    threaded server cannot share. Routes are left in the database, so use
+    a scratch one.
+
+    Usage::
+
+        DB_URL=sqlite:////tmp/loadtest.db python -m benchmarks.loadtest \\
+            --concurrency 32 --duration 30 --size 2500
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import app, db
+from benchmarks.graphs import build_graph, grid_network
+from benchmarks.suite import percentile, random_pairs
+
+# relative weights of the requests each connection sends
+MIX = {
+    "list": 5,
+    "create": 10,
+    "get": 30,
+    "update": 10,
+    "delete": 5,
+    "cost": 40,
+}
+
+ENDPOINTS = {
+    "list": "GET /routes",
+    "create": "POST /routes",
+    "get": "GET /routes/pk",
+    "update": "PUT /routes/pk",
+    "delete": "DELETE /routes/pk",
+    "cost": "POST /routes/calculate-cost",
+}
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+
+def serve(host, port):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    with app.app_context():
+        db.create_all()
+    make_server(
+        host, port, app, threaded=True, request_handler=KeepAliveRequestHandler
+    ).serve_forever()
+
+
+def start_server(host="127.0.0.1", port=5055):
+    """Serve the app from a child process and return it once it answers."""
+    process = multiprocessing.get_context("fork").Process(
+        target=serve, args=(host, port), daemon=True
+    )
+    process.start()
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return process
+        except OSError:
+            if not process.is_alive():
+                break
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("The app did not start on {}:{}".format(host, port))
+
+
+def seed_network(host, port, edges):
+    body = "".join(
+        json.dumps({"origin_point": o, "destination_point": d, "distance": distance})
+        + "\n"
+        for o, d, distance in edges
+    )
+    connection = http.client.HTTPConnection(host, port, timeout=600)
+    connection.request(
+        "POST",
+        "/routes/import",
+        body.encode("utf-8"),
+        {"Content-Type": "application/x-ndjson"},
+    )
+    response = connection.getresponse()
+    report = json.loads(response.read())
+    connection.close()
+    if response.status >= 400:
+        raise RuntimeError(report)
+    return report
+
+
+class Client(object):
+    """One keep-alive connection sending a random mix of requests, and
+    recording ``(endpoint, status, seconds)`` for each."""
+
+    def __init__(self, host, port, number, pairs, points, mix, seed):
+        self.host = host
+        self.port = port
+        self.number = number
+        self.pairs = pairs
+        self.points = points
+        self.rng = random.Random(seed)
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.created = []
+        self.sent = 0
+        self.samples = []
+        self.connection = None
+
+    def request(self, kind, method, path, body=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=60
+            )
+
+        headers = {}
+        if body is not None:
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            data, status = b"", 0
+        self.samples.append((kind, status, time.perf_counter() - start))
+
+        if status and response.getheader("Connection", "").lower() == "close":
+            self.connection.close()
+            self.connection = None
+        return status, data
+
+    def step(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        # reads and writes of single routes need a route of this client's
+        if kind in ("get", "update", "delete") and not self.created:
+            kind = "create"
+
+        if kind == "list":
+            self.request(kind, "GET", "/routes?limit=100")
+        elif kind == "create":
+            self.sent += 1
+            route = {
+                "origin_point": "load-{}-{}".format(self.number, self.sent),
+                "destination_point": self.rng.choice(self.points),
+                "distance": self.rng.randint(1, 100),
+            }
+            status, data = self.request(kind, "POST", "/routes", route)
+            if status == 201:
+                uri = json.loads(data)["route"]["uri"]
+                self.created.append(uri)
+        elif kind == "get":
+            self.request(kind, "GET", self.rng.choice(self.created))
+        elif kind == "update":
+            body = {"distance": self.rng.randint(1, 100)}
+            self.request(kind, "PUT", self.rng.choice(self.created), body)
+        elif kind == "delete":
+            uri = self.created.pop(self.rng.randrange(len(self.created)))
+            self.request(kind, "DELETE", uri)
+        else:
+            origin, destination = self.rng.choice(self.pairs)
+            body = {
+                "origin_point": origin,
+                "destination_point": destination,
+                "autonomy": 10,
+                "fuel_price": 2.5,
+            }
+            self.request(kind, "POST", "/routes/calculate-cost", body)
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            self.step()
+        if self.connection is not None:
+            self.connection.close()
+
+
+def run_load(host, port, concurrency, duration, pairs, points, mix, seed=0):
+    """Run ``concurrency`` clients for ``duration`` seconds and return
+    their samples."""
+    clients = [
+        Client(host, port, number, pairs, points, mix, seed + number)
+        for number in range(concurrency)
+    ]
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client.run, args=(deadline,)) for client in clients
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return [sample for client in clients for sample in client.samples]
+
+
+def summarize(samples, elapsed):
+    """Throughput, errors and latency percentiles, in milliseconds, by
+    endpoint and overall."""
+    groups = {}
+    for kind, status, seconds in samples:
+        groups.setdefault(ENDPOINTS[kind], []).append((status, seconds))
+    groups["total"] = [(status, seconds) for _, status, seconds in samples]
+
+    report = {}
+    for endpoint, group in groups.items():
+        latencies = [seconds * 1000 for _, seconds in group]
+        report[endpoint] = {
+            "requests": len(group),
+            "errors": sum(1 for status, _ in group if not 200 <= status < 300),
+            "throughput": len(group) / elapsed,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+        }
+    return report
+
+
+def print_report(report, file=sys.stdout):
+    print(
+        "{:<30} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+            "endpoint", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms"
+        ),
+        file=file,
+    )
+    for endpoint, stats in report.items():
+        print(
+            "{:<30} {requests:>9} {errors:>7} {throughput:9.1f} {p50:9.2f}"
+            " {p95:9.2f} {p99:9.2f}".format(endpoint, **stats),
+            file=file,
+        )
+
+
+def parse_mix(value):
+    """``"get=30,cost=40"`` into ``{"get": 30, "cost": 40}``."""
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in MIX:
+            raise argparse.ArgumentTypeError(
+                "unknown request '{}', use: {}".format(kind, ", ".join(MIX))
+            )
+        mix[kind] = int(weight)
+    return mix
+
+
+def load_test(
+    url=None, concurrency=16, duration=10, size=2500, mix=None, seed=0, seed_routes=True
+):
+    """Seed a grid of about ``size`` points, load the server at ``url``, or
+    a local one, and return the report."""
+    process = None
+    if url is None:
+        host, port = "127.0.0.1", 5055
+        process = start_server(host, port)
+    else:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+
+    try:
+        edges, _ = grid_network(size, seed=seed)
+        if seed_routes:
+            seed_network(host, port, edges)
+        graph = build_graph(edges)
+        pairs = random_pairs(graph, 1000, seed)
+
+        start = time.monotonic()
+        samples = run_load(
+            host,
+            port,
+            concurrency,
+            duration,
+            pairs,
+            sorted(graph.nodes),
+            mix or MIX,
+            seed,
+        )
+        report = summarize(samples, time.monotonic() - start)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="server to load, instead of a local one")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--size", type=int, default=2500)
+    parser.add_argument(
+        "--mix", type=parse_mix, help="request weights, like 'get=30,cost=40'"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-seed-routes",
+        dest="seed_routes",
+        action="store_false",
+        help="the grid was imported by an earlier run",
+    )
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = load_test(
+        args.url,
+        args.concurrency,
+        args.duration,
+        args.size,
+        args.mix,
+        args.seed,
+        args.seed_routes,
+    )
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+    Parallel Search Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Times single-source searches from many origins on a ``SearchPool``
+    with 1 to N worker processes, against the same searches run in the
+    calling process.
+
+    Usage::
+
+        python -m benchmarks.parallel --size 100000 --origins 64 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import random
+import time
+
+from app.dijkstra.csr import CSRGraph, csr_dijkstra
+from app.dijkstra.parallel import SearchPool
+from benchmarks.graphs import geometric_network
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--origins", type=int, default=64)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count()})
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    edges, _ = geometric_network(args.size, seed=args.seed)
+    graph = CSRGraph.from_edges(edges)
+    rng = random.Random(args.seed)
+    origins = ["P{}".format(rng.randrange(args.size)) for _ in range(args.origins)]
+    destinations = ["P{}".format(rng.randrange(args.size)) for _ in range(100)]
+
+    start = time.perf_counter()
+    for origin in origins:
+        csr_dijkstra(graph, graph.ids[origin])
+    serial = time.perf_counter() - start
+
+    print("{:>8} {:>10} {:>8}".format("workers", "time (s)", "speedup"))
+    print("{:>8} {:10.2f} {:8.2f}".format("serial", serial, 1.0))
+
+    for workers in args.workers:
+        with SearchPool(graph, workers) as pool:
+            # start the processes before timing
+            list(pool.distance_rows(origins[:workers], destinations))
+            start = time.perf_counter()
+            list(pool.distance_rows(origins, destinations))
+            elapsed = time.perf_counter() - start
+
+        print("{:>8} {:10.2f} {:8.2f}".format(workers, elapsed, serial / elapsed))
+
+
+if __name__ == "__main__":
+    main()
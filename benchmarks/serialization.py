@@ -0,0 +1,72 @@
+"""
+    Route Serialization Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares writing a route list with ``marshal`` and ``json.dumps`` on
+    ORM objects, as ``GET /routes`` used to, with the ``RouteSerializer``
+    on column rows. Both must produce the same bytes.
+
+    Usage::
+
+        python -m benchmarks.serialization --routes 100000
+"""
+
+import argparse
+import json
+import time
+
+from flask_restful import fields, marshal
+
+from app import app, db
+from app.models import Route, query_routes
+from app.serializers import route_serializer
+from benchmarks.graphs import load_network, random_edges
+
+route_fields = {
+    "origin_point": fields.String,
+    "destination_point": fields.String,
+    "distance": fields.Integer,
+    "uri": fields.Url("route"),
+}
+
+
+def with_marshal():
+    routes = Route.query.all()
+    return json.dumps({"routes": [marshal(route, route_fields) for route in routes]})
+
+
+def with_serializer():
+    return route_serializer.routes(query_routes().all()).get_data(as_text=True)[:-1]
+
+
+def measure(serialize):
+    db.session.expire_all()
+    start = time.perf_counter()
+    body = serialize()
+    return time.perf_counter() - start, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app.debug = False
+    with app.app_context():
+        db.create_all()
+        load_network(random_edges(args.routes // 4, seed=args.seed))
+
+    with app.test_request_context("/routes"):
+        before, expected = measure(with_marshal)
+        after, body = measure(with_serializer)
+    assert body == expected
+
+    print("{:>12} {:>10}".format("serializer", "time (s)"))
+    print("{:>12} {:10.3f}".format("marshal", before))
+    print("{:>12} {:10.3f}".format("rows", after))
+    print("{:>12} {:9.2f}x".format("speedup", before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+    Benchmark Suite
+    ~~~~~~~~~~~~~~~
+
+    Runs every engine on grid, random geometric and scale-free networks
+    of each size, then loads each network into the ``routes`` table and
+    times ``/routes/calculate-cost`` through the Flask test client. Engine
+    and request latencies, graph load times and graph memory are written
+    as JSON, along with the commit they were measured on.
+
+    All networks and queries are seeded, so two runs measure the same
+    work and their results can be compared with ``--compare``. The
+    ``routes`` and ``points`` tables are replaced, so point ``DB_URL`` at a
+    scratch database.
+
+    Usage::
+
+        python -m benchmarks.suite --sizes 1000 10000 --output before.json
+        python -m benchmarks.suite --compare before.json after.json
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy.engine import make_url
+
+from app import app, db
+from app.dijkstra import ENGINES, heap_dijkstra
+from app.dijkstra.csr import CSRGraph, get_csr_shortest_path
+from app.models import path_cache, routing_graph
+from benchmarks.graphs import NETWORKS, build_graph, load_network
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(latencies):
+    return {
+        "queries": len(latencies),
+        "mean": statistics.fmean(latencies),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def random_pairs(graph, count, seed):
+    """``count`` seeded ``(origin, destination)`` pairs of distinct points
+    with a path between them, since ``/routes/calculate-cost`` fails on the
+    others. Origins that reach no other point are drawn again."""
+    rng = random.Random(seed)
+    names = sorted(graph.nodes)
+    pairs = []
+    while len(pairs) < count:
+        origin = rng.choice(names)
+        visited, _ = heap_dijkstra(graph, origin)
+        destinations = [name for name in sorted(visited) if name != origin]
+        if destinations:
+            pairs.append((origin, rng.choice(destinations)))
+    return pairs
+
+
+def time_queries(engine, graph, pairs):
+    latencies = []
+    for origin, destination in pairs:
+        start = time.perf_counter()
+        try:
+            engine(graph, origin, destination)
+        except KeyError:
+            pass
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def traced_size(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    value = build(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def measure_engines(edges, coordinates, pairs):
+    graph, graph_size = traced_size(build_graph, edges, coordinates)
+    csr, csr_size = traced_size(CSRGraph.from_edges, edges)
+
+    engines = {
+        name: time_queries(engine, graph, pairs)
+        for name, engine in sorted(ENGINES.items())
+        # synthetic coordinates are planar, not latitude and longitude, and
+        # without them A* is plain Dijkstra
+        if name != "astar" and (coordinates or name != "astar_euclidean")
+    }
+    engines["csr"] = time_queries(get_csr_shortest_path, csr, pairs)
+
+    return engines, {"Graph": graph_size, "CSRGraph": csr_size}
+
+
+def measure_requests(edges, coordinates, pairs):
+    """Time graph loads and cost requests on the network in the ``routes``
+    table, without the path cache or the all-pairs table."""
+    client = app.test_client()
+
+    with app.app_context():
+        load_network(edges, coordinates)
+
+        loads = []
+        for _ in range(3):
+            routing_graph.invalidate()
+            start = time.perf_counter()
+            routing_graph.get()
+            loads.append(time.perf_counter() - start)
+
+    latencies = []
+    for origin, destination in pairs:
+        data = {
+            "origin_point": origin,
+            "destination_point": destination,
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        start = time.perf_counter()
+        response = client.post("/routes/calculate-cost", json=data)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(response.get_data(as_text=True))
+
+    return summarize(loads), summarize(latencies)
+
+
+def run(args):
+    app.config["ALL_PAIRS_MAX_NODES"] = 0
+    app.config["ROUTING_ENGINE"] = args.engine
+    path_cache.maxsize = 0
+    with app.app_context():
+        db.create_all()
+
+    results = []
+    for kind in args.networks:
+        for size in args.sizes:
+            edges, coordinates = NETWORKS[kind](size, seed=args.seed)
+            graph = build_graph(edges, coordinates)
+            pairs = random_pairs(graph, args.queries, args.seed)
+
+            engines, memory = measure_engines(edges, coordinates, pairs)
+            graph_load, requests = measure_requests(edges, coordinates, pairs)
+            results.append(
+                {
+                    "network": kind,
+                    "size": size,
+                    "points": len(graph.nodes),
+                    "routes": len(edges),
+                    "engines": engines,
+                    "memory": memory,
+                    "graph_load": graph_load,
+                    "requests": requests,
+                }
+            )
+            print(
+                "{:>10} {:>8} {:>8} routes: dijkstra p50 {:.4f}s,"
+                " request p50 {:.4f}s".format(
+                    kind,
+                    size,
+                    len(edges),
+                    engines["dijkstra"]["p50"],
+                    requests["p50"],
+                ),
+                file=sys.stderr,
+            )
+
+    return results
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latencies(result):
+    measures = {"engine " + name: stats for name, stats in result["engines"].items()}
+    measures["graph load"] = result["graph_load"]
+    measures["request"] = result["requests"]
+    return measures
+
+
+def compare(before, after):
+    """Print the ratio of every median latency in ``after`` to ``before``."""
+    previous = {(r["network"], r["size"]): latencies(r) for r in before["results"]}
+
+    print(
+        "{:>10} {:>8} {:>24} {:>10} {:>10} {:>7}".format(
+            "network", "size", "p50 of", "before", "after", "ratio"
+        )
+    )
+    for result in after["results"]:
+        key = (result["network"], result["size"])
+        for name, stats in latencies(result).items():
+            if name not in previous.get(key, {}):
+                continue
+            old, new = previous[key][name]["p50"], stats["p50"]
+            print(
+                "{:>10} {:>8} {:>24} {:10.5f} {:10.5f} {:7.2f}".format(
+                    key[0], key[1], name, old, new, new / old
+                )
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--networks", nargs="+", choices=sorted(NETWORKS), default=sorted(NETWORKS)
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default="dijkstra",
+        help="ROUTING_ENGINE for the request measurements",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="write the results to this file instead of stdout"
+    )
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+
+    report = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "database": make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name(),
+        "seed": args.seed,
+        "queries": args.queries,
+        "engine": args.engine,
+        "results": run(args),
+    }
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+    Request Validation Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares the CPU time of validating a ``/routes/calculate-cost`` body
+    with a ``reqparse.RequestParser`` built per request, as the resources
+    used to, and with the shared ``Schema``.
+
+    Usage::
+
+        python -m benchmarks.validation --iterations 20000
+"""
+
+import argparse
+import time
+
+from flask_restful import reqparse
+
+from app import app
+from app.calculations import cost_schema
+from app.fields import float_field, integer_field, paths_field
+
+BODY = {
+    "origin_point": "A",
+    "destination_point": "D",
+    "autonomy": 10,
+    "fuel_price": 2.5,
+    "k": 3,
+}
+
+
+def parse_with_reqparse():
+    parser = reqparse.RequestParser()
+    parser.add_argument("origin_point", type=str, required=True, location="json")
+    parser.add_argument("destination_point", type=str, required=True, location="json")
+    parser.add_argument("autonomy", type=integer_field, required=True, location="json")
+    parser.add_argument("fuel_price", type=float_field, required=True, location="json")
+    parser.add_argument("k", type=paths_field, location="json")
+    return parser.parse_args()
+
+
+def measure(parse, iterations):
+    with app.test_request_context("/routes/calculate-cost", method="POST", json=BODY):
+        # both parsers must agree before they are timed
+        assert dict(parse()) == dict(BODY)
+        start = time.process_time()
+        for _ in range(iterations):
+            parse()
+        return (time.process_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    before = measure(parse_with_reqparse, args.iterations)
+    after = measure(cost_schema.parse, args.iterations)
+
+    print("{:>10} {:>14}".format("parser", "us/request"))
+    print("{:>10} {:14.2f}".format("reqparse", before * 1e6))
+    print("{:>10} {:14.2f}".format("schema", after * 1e6))
+    print("{:>10} {:14.2f}x".format("speedup", before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,20 @@ class Config(object):
     TESTING = False
     SQLALCHEMY_DATABASE_URI = os.environ["DB_URL"]
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    PATH_CACHE_SIZE = 1024
+    ROUTING_ENGINE = "dijkstra"
+    CH_PATH = os.environ.get("CH_PATH", "routes.ch")
+    SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "routes.snapshot")
+    IMPORT_BATCH_SIZE = 10000
+    GRAPH_SYNC_INTERVAL = 0.1
+    REVISION_RETENTION = 100000
+    ALL_PAIRS_MAX_NODES = 2000
+    PARALLEL_WORKERS = 0
+    PARALLEL_MIN_ORIGINS = 8
+    JOB_WORKERS = 2
+    JOB_TIMEOUT = 600
+    METRICS_ENABLED = False
+    SERVER_TIMING = False
 
 
 class ProductionConfig(Config):
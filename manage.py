@@ -1,15 +1,66 @@
-from flask.ext.migrate import Migrate, MigrateCommand
-from flask.ext.script import Manager
+import click
+from flask.cli import FlaskGroup
+from flask_migrate import Migrate
 from app import app, db
+from app.importer import READERS, import_routes
+from app.models import build_hierarchy, build_snapshot
 
 import os
 
 app.config.from_object(os.environ['APP_SETTINGS'])
 
+# adds the "db" commands
 migrate = Migrate(app, db)
-manager = Manager(app)
+manager = FlaskGroup(create_app=lambda: app)
+
+
+@app.cli.command('rebuild_hierarchy')
+def rebuild_hierarchy():
+    """Rebuild the contraction hierarchy used by the "ch" routing engine."""
+    hierarchy = build_hierarchy(app.config['CH_PATH'])
+    print('Contracted {} points into {}'.format(
+        len(hierarchy.rank), app.config['CH_PATH']))
+
+
+@app.cli.command('rebuild_snapshot')
+def rebuild_snapshot():
+    """Rebuild the route snapshot used by the "csr" routing engine."""
+    snapshot = build_snapshot(app.config['SNAPSHOT_PATH'])
+    print('Wrote {} points and {} routes to {}'.format(
+        len(snapshot), len(snapshot.targets), app.config['SNAPSHOT_PATH']))
+
+
+@app.cli.command('bulk_import')
+@click.argument('path')
+@click.option('-b', '--batch-size', 'batch_size', type=int, default=None)
+def bulk_import(path, batch_size=None):
+    """Import routes from a CSV (with a header row) or NDJSON file."""
+    format = 'csv' if path.endswith('.csv') else 'ndjson'
+    with open(path, encoding='utf-8', newline='') as handle:
+        report = import_routes(READERS[format](handle),
+                               batch_size or app.config['IMPORT_BATCH_SIZE'])
+
+    for number, batch in enumerate(report['batches'], 1):
+        print('batch {}: {} received, {} inserted'.format(
+            number, batch['received'], batch['inserted']))
+    for error in report['errors']:
+        print('line {}: {}'.format(error['line'], error['error']))
+    print('{} inserted, {} rejected'.format(report['inserted'], report['rejected']))
+
+
+@app.cli.command('load_test')
+@click.option('-u', '--url', 'url', default=None,
+              help='server to load, instead of a local one')
+@click.option('-c', '--concurrency', 'concurrency', type=int, default=16)
+@click.option('-d', '--duration', 'duration', type=float, default=10)
+@click.option('-s', '--size', 'size', type=int, default=2500)
+def load_test(url=None, concurrency=16, duration=10, size=2500):
+    """Load the API with a mix of requests and report latency percentiles."""
+    # the harness is only loaded for this command
+    from benchmarks.loadtest import load_test as run_load_test, print_report
+
+    print_report(run_load_test(url, concurrency, duration, size))
 
-manager.add_command('db', MigrateCommand)
 
 if __name__ == '__main__':
-    manager.run()
+    manager()
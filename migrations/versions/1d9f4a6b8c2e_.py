@@ -0,0 +1,23 @@
+"""add indexes on route points
+
+Revision ID: 1d9f4a6b8c2e
+Revises: 4b1e7c2d9a3f
+Create Date: 2026-10-17 14:03:27.905114
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1d9f4a6b8c2e'
+down_revision = '4b1e7c2d9a3f'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(op.f('ix_routes_origin_point'), 'routes', ['origin_point'], unique=False)
+    op.create_index(op.f('ix_routes_destination_point'), 'routes', ['destination_point'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_routes_destination_point'), table_name='routes')
+    op.drop_index(op.f('ix_routes_origin_point'), table_name='routes')
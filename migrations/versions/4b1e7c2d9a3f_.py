@@ -0,0 +1,31 @@
+"""add points table
+
+Revision ID: 4b1e7c2d9a3f
+Revises: 2620df0c61c
+Create Date: 2026-10-17 10:12:44.318402
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4b1e7c2d9a3f'
+down_revision = '2620df0c61c'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('points',
+    sa.Column('pk', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('name', sa.String(length=128), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('pk'),
+    sa.UniqueConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('points')
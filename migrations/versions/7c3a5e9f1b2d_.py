@@ -0,0 +1,32 @@
+"""add route revisions table
+
+Revision ID: 7c3a5e9f1b2d
+Revises: 1d9f4a6b8c2e
+Create Date: 2026-10-17 16:41:09.552870
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7c3a5e9f1b2d'
+down_revision = '1d9f4a6b8c2e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('route_revisions',
+    sa.Column('pk', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('action', sa.String(length=8), nullable=False),
+    sa.Column('route_pk', sa.Integer(), nullable=True),
+    sa.Column('origin_point', sa.String(length=128), nullable=True),
+    sa.Column('destination_point', sa.String(length=128), nullable=True),
+    sa.Column('distance', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('pk')
+    )
+
+
+def downgrade():
+    op.drop_table('route_revisions')
@@ -0,0 +1,32 @@
+"""add jobs table
+
+Revision ID: 9e2b6d4f8a1c
+Revises: 7c3a5e9f1b2d
+Create Date: 2026-10-18 00:12:37.204518
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9e2b6d4f8a1c'
+down_revision = '7c3a5e9f1b2d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('pk', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('status', sa.String(length=8), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('pk')
+    )
+
+
+def downgrade():
+    op.drop_table('jobs')
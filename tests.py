@@ -5,11 +5,76 @@
     Tests for the Routes API
 """
 
+import argparse
+import contextlib
+import csv
+import datetime
+import io
 import json
+import os
+import random
+import tempfile
 import unittest
 
+import sqlalchemy
+from flask_restful import fields, marshal
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql.base import PGCompiler
+from sqlalchemy.dialects.sqlite.base import SQLiteCompiler
+from werkzeug.http import parse_etags
+from werkzeug.exceptions import HTTPException
+
+import manage
 from app import app, db
-from app.models import Route
+from app.cache import BackgroundBuild, PathCache, RoutingGraph
+from app.dijkstra import (
+    Graph,
+    astar,
+    bidirectional_dijkstra,
+    dijkstra,
+    euclidean,
+    get_shortest_path,
+    great_circle,
+    heap_dijkstra,
+)
+from app.dijkstra.allpairs import AllPairs
+from app.fields import integer_field, positive_integer_field
+from app.importer import copy_buffer
+from app.dijkstra.ch import ContractionHierarchy
+from app.dijkstra.csr import (
+    UNREACHED,
+    CSRGraph,
+    csr_dijkstra,
+    get_csr_shortest_path,
+)
+from app.dijkstra.parallel import SearchPool
+from app.dijkstra.yen import k_shortest_paths
+from app.jobs import JobQueue, job_queue, recover_jobs, run_job
+from app.metrics import Metrics, metrics
+from app.schema import Field, Schema
+from benchmarks.graphs import NETWORKS, build_graph, grid_network
+from benchmarks.suite import random_pairs, run as run_suite
+from app.models import (
+    ROUTE_COLUMNS,
+    Job,
+    Point,
+    Route,
+    RouteRevision,
+    all_pairs,
+    build_hierarchy,
+    build_snapshot,
+    get_all_pairs,
+    hierarchy_file,
+    load_changes,
+    load_csr_graph,
+    load_revision,
+    load_routes,
+    path_cache,
+    routing_graph,
+    search_pools,
+    snapshot_file,
+    version_filter,
+)
 
 
 def clean_db(func):
@@ -17,6 +82,7 @@ def clean_db(func):
         with app.app_context():
             db.drop_all()
             db.create_all()
+            routing_graph.invalidate()
             return func(*args, **kwargs)
 
     return inner
@@ -33,6 +99,752 @@ class RouteModelTestCase(unittest.TestCase):
         self.assertEqual(expected, repr(route))
 
 
+class PointModelTestCase(unittest.TestCase):
+    def test_point_representation(self):
+        point = Point(name="A", latitude=-23.5, longitude=-46.6)
+        expected = "<Point A (-23.5, -46.6)>"
+
+        self.assertEqual(expected, repr(point))
+
+
+def random_edges(size, edges, seed):
+    rng = random.Random(seed)
+    routes = {}
+
+    for _ in range(edges):
+        origin = "P{}".format(rng.randrange(size))
+        destination = "P{}".format(rng.randrange(size))
+        routes[(origin, destination)] = rng.randint(1, 50)
+
+    return [
+        (origin, destination, distance)
+        for (origin, destination), distance in routes.items()
+    ]
+
+
+def random_graph(size, edges, seed):
+    graph = Graph()
+
+    for origin, destination, distance in random_edges(size, edges, seed):
+        graph.add_node(origin)
+        graph.add_edge(origin, destination, distance)
+
+    return graph
+
+
+@contextlib.contextmanager
+def parallel_searches(workers=2):
+    settings = {"PARALLEL_WORKERS": workers, "PARALLEL_MIN_ORIGINS": 1}
+    previous = {name: app.config[name] for name in settings}
+    app.config.update(settings)
+    try:
+        yield
+    finally:
+        app.config.update(previous)
+        search_pools.clear()
+
+
+@contextlib.contextmanager
+def sqlite_returning():
+    """Write routes with RETURNING on SQLite, as SQLAlchemy 2.0 does."""
+    with app.app_context():
+        dialect = db.engine.dialect
+    full_returning, dialect.full_returning = dialect.full_returning, True
+    SQLiteCompiler.returning_clause = PGCompiler.returning_clause
+    try:
+        yield
+    finally:
+        dialect.full_returning = full_returning
+        del SQLiteCompiler.returning_clause
+
+
+@contextlib.contextmanager
+def snapshot_engine():
+    """Search a fresh snapshot with the "csr" engine, and check that the
+    routing graph is never built."""
+    with tempfile.TemporaryDirectory() as directory:
+        settings = {
+            "ROUTING_ENGINE": "csr",
+            "SNAPSHOT_PATH": os.path.join(directory, "routes.snapshot"),
+        }
+        previous = {name: app.config[name] for name in settings}
+        app.config.update(settings)
+        try:
+            with app.app_context():
+                build_snapshot(app.config["SNAPSHOT_PATH"])
+            routing_graph.invalidate()
+            yield
+            assert routing_graph.is_stale()
+        finally:
+            app.config.update(previous)
+
+
+class DijkstraTestCase(unittest.TestCase):
+    def test_heap_dijkstra_matches_dijkstra(self):
+        for seed in range(20):
+            graph = random_graph(30, 90, seed)
+            for origin in sorted(graph.nodes):
+                expected, _ = dijkstra(graph, origin)
+                result, _ = heap_dijkstra(graph, origin)
+
+                self.assertEqual(result, expected)
+
+    def test_heap_dijkstra_early_exit(self):
+        for seed in range(20):
+            graph = random_graph(30, 90, seed)
+            expected, _ = dijkstra(graph, "P0")
+            for destination in expected:
+                result, _ = heap_dijkstra(graph, "P0", destination)
+
+                self.assertEqual(result[destination], expected[destination])
+
+    def test_get_shortest_path(self):
+        graph = Graph()
+        for origin, destination, distance in [
+            ("A", "B", 10),
+            ("A", "C", 20),
+            ("B", "D", 15),
+            ("C", "D", 30),
+            ("B", "E", 50),
+            ("D", "E", 30),
+        ]:
+            graph.add_node(origin)
+            graph.add_edge(origin, destination, distance)
+
+        self.assertEqual(get_shortest_path(graph, "A", "E"), (55, ["A", "B", "D", "E"]))
+
+    def test_parallel_edges(self):
+        graph = Graph()
+        graph.add_node("A")
+        graph.add_edge("A", "B", 10, 1)
+        graph.add_edge("A", "B", 7, 2)
+
+        self.assertEqual(graph.edges["A"], ["B"])
+        self.assertEqual(graph.distances[("A", "B")], 7)
+
+        graph.remove_edge(2)
+
+        self.assertEqual(graph.distances[("A", "B")], 10)
+
+        graph.remove_edge(1)
+
+        self.assertEqual(graph.edges["A"], [])
+        self.assertEqual(graph.reverse_edges["B"], [])
+        self.assertNotIn(("A", "B"), graph.distances)
+
+    def test_parallel_edges_without_the_first(self):
+        graph = Graph()
+        graph.add_node("A")
+        graph.add_edge("A", "B", 10, 1)
+
+        self.assertEqual(graph.parallel, {})
+
+        graph.add_edge("A", "B", 7, 2)
+        graph.remove_edge(1)
+
+        self.assertEqual(graph.distances[("A", "B")], 7)
+        self.assertEqual(graph.parallel, {})
+
+        graph.add_edge("A", "B", 12, 3)
+        graph.remove_edge(2)
+
+        self.assertEqual(graph.distances[("A", "B")], 12)
+
+        graph.remove_edge(3)
+
+        self.assertEqual(graph.edges["A"], [])
+        self.assertEqual(graph.routes, {})
+        self.assertEqual(graph.distances, {})
+
+    def test_update_edge(self):
+        graph = Graph()
+        graph.add_node("A")
+        graph.add_edge("A", "B", 10, 1)
+        graph.update_edge(1, "A", "C", 4)
+
+        self.assertEqual(graph.edges["A"], ["C"])
+        self.assertEqual(graph.reverse_edges["B"], [])
+        self.assertEqual(graph.distances, {("A", "C"): 4})
+
+
+class BidirectionalDijkstraTestCase(unittest.TestCase):
+    def test_bidirectional_dijkstra_matches_dijkstra(self):
+        for seed in range(20):
+            graph = random_graph(30, 90, seed)
+            expected, _ = dijkstra(graph, "P0")
+            for destination in ["P{}".format(i) for i in range(1, 30)]:
+                if destination not in expected:
+                    with self.assertRaises(KeyError):
+                        bidirectional_dijkstra(graph, "P0", destination)
+                    continue
+
+                distance, path = bidirectional_dijkstra(graph, "P0", destination)
+
+                self.assertEqual(distance, expected[destination])
+                self.assertEqual(path[0], "P0")
+                self.assertEqual(path[-1], destination)
+                self.assertEqual(
+                    sum(graph.distances[edge] for edge in zip(path, path[1:])),
+                    distance,
+                )
+
+    def test_get_shortest_path_with_bidirectional_engine(self):
+        graph = random_graph(30, 90, 0)
+
+        self.assertEqual(
+            get_shortest_path(graph, "P0", "P5", "bidirectional")[0],
+            get_shortest_path(graph, "P0", "P5")[0],
+        )
+
+
+class AStarTestCase(unittest.TestCase):
+    def geometric_graph(self, seed):
+        rng = random.Random(seed)
+        graph = Graph()
+        for i in range(30):
+            graph.set_coordinates(
+                "P{}".format(i), rng.random() * 100, rng.random() * 100
+            )
+        for _ in range(120):
+            origin = "P{}".format(rng.randrange(30))
+            destination = "P{}".format(rng.randrange(30))
+            straight = euclidean(
+                graph.coordinates[origin], graph.coordinates[destination]
+            )
+            graph.add_node(origin)
+            graph.add_edge(origin, destination, int(straight) + rng.randint(1, 20))
+        return graph
+
+    def test_astar_matches_dijkstra(self):
+        for seed in range(20):
+            graph = self.geometric_graph(seed)
+            expected, _ = dijkstra(graph, "P0")
+            for destination in sorted(expected):
+                if destination == "P0":
+                    continue
+                stats = {}
+                distance, path = astar(graph, "P0", destination, euclidean, stats)
+
+                self.assertEqual(distance, expected[destination])
+                self.assertEqual(path[0], "P0")
+                self.assertEqual(path[-1], destination)
+                self.assertGreater(stats["settled"], 0)
+
+    def test_astar_without_coordinates(self):
+        graph = random_graph(30, 90, 0)
+        expected, _ = dijkstra(graph, "P0")
+        destination = max(expected, key=expected.get)
+
+        self.assertEqual(astar(graph, "P0", destination)[0], expected[destination])
+
+    def test_great_circle(self):
+        # Sao Paulo to Rio de Janeiro
+        distance = great_circle((-23.5505, -46.6333), (-22.9068, -43.1729))
+
+        self.assertAlmostEqual(distance, 361, delta=1)
+
+
+class KShortestPathsTestCase(unittest.TestCase):
+    def simple_paths(self, graph, origin, destination):
+        """Every loopless path, by depth-first enumeration."""
+        found = []
+        stack = [(0, [origin])]
+        while stack:
+            distance, path = stack.pop()
+            if path[-1] == destination:
+                found.append((distance, path))
+                continue
+            for edge in graph.edges[path[-1]]:
+                if edge not in path:
+                    weight = distance + graph.distances[(path[-1], edge)]
+                    stack.append((weight, path + [edge]))
+        return sorted(found)
+
+    def test_k_shortest_paths_match_enumeration(self):
+        for seed in range(20):
+            graph = random_graph(10, 30, seed)
+            for destination in ["P{}".format(i) for i in range(1, 10)]:
+                expected = self.simple_paths(graph, "P0", destination)
+                result = k_shortest_paths(graph, "P0", destination, 5)
+
+                self.assertEqual(
+                    [distance for distance, _ in result],
+                    [distance for distance, _ in expected[:5]],
+                )
+                for distance, path in result:
+                    self.assertIn((distance, path), expected)
+                self.assertEqual(len({tuple(path) for _, path in result}), len(result))
+
+    def test_k_shortest_paths_without_path(self):
+        graph = random_graph(10, 30, 0)
+        graph.add_node("Z")
+
+        self.assertEqual(k_shortest_paths(graph, "P0", "Z", 3), [])
+        self.assertEqual(k_shortest_paths(graph, "P0", "P0", 3), [])
+
+
+class AllPairsTestCase(unittest.TestCase):
+    def test_all_pairs_match_dijkstra(self):
+        for seed in range(10):
+            edges = random_edges(30, 90, seed)
+            graph = random_graph(30, 90, seed)
+            table = AllPairs.build(CSRGraph.from_edges(edges))
+            for origin in table.graph.names:
+                expected, _ = dijkstra(graph, origin)
+                for destination in table.graph.names:
+                    if destination == origin or destination not in expected:
+                        with self.assertRaises(KeyError):
+                            table.shortest_path(origin, destination)
+                        continue
+                    distance, path = table.shortest_path(origin, destination)
+
+                    self.assertEqual(distance, expected[destination])
+                    self.assertEqual(
+                        sum(graph.distances[edge] for edge in zip(path, path[1:])),
+                        distance,
+                    )
+
+    def test_distance_row(self):
+        table = AllPairs.build(
+            CSRGraph.from_edges([("A", "B", 10), ("B", "C", 5), ("D", "A", 1)])
+        )
+
+        self.assertEqual(
+            table.distance_row("A", ["A", "C", "D", "X"]), [0, 15, None, None]
+        )
+        self.assertEqual(table.distance_row("X", ["A"]), [None])
+
+
+class SearchPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = CSRGraph.from_edges(random_edges(30, 90, 0))
+        self.pool = SearchPool(self.graph, 2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_trees_match_csr_dijkstra(self):
+        sources = range(len(self.graph))
+        trees = list(self.pool.trees(sources))
+
+        self.assertEqual(
+            trees, [csr_dijkstra(self.graph, source) for source in sources]
+        )
+        self.assertEqual(
+            AllPairs.build(self.graph, self.pool).distances,
+            AllPairs.build(self.graph).distances,
+        )
+
+    def test_distance_rows_and_shortest_paths(self):
+        origins = ["P0", "P1", "X"]
+        destinations = ["P2", "P3", "P0", "X"]
+        table = AllPairs.build(self.graph)
+
+        self.assertEqual(
+            list(self.pool.distance_rows(origins, destinations)),
+            [table.distance_row(origin, destinations) for origin in origins],
+        )
+        for origin, paths in zip(
+            origins, self.pool.shortest_paths(origins, [destinations] * 3)
+        ):
+            expected = table.shortest_paths(origin, destinations)
+
+            self.assertEqual(
+                {point: distance for point, (distance, _) in paths.items()},
+                {point: distance for point, (distance, _) in expected.items()},
+            )
+
+
+class ContractionHierarchyTestCase(unittest.TestCase):
+    def test_hierarchy_matches_dijkstra(self):
+        for seed in range(20):
+            graph = random_graph(30, 90, seed)
+            hierarchy = ContractionHierarchy.build(graph)
+            expected, _ = dijkstra(graph, "P0")
+            for destination in ["P{}".format(i) for i in range(1, 30)]:
+                if destination not in expected:
+                    with self.assertRaises(KeyError):
+                        hierarchy.shortest_path("P0", destination)
+                    continue
+
+                stats = {}
+                distance, path = hierarchy.shortest_path("P0", destination, stats)
+
+                self.assertEqual(distance, expected[destination])
+                self.assertEqual(path[0], "P0")
+                self.assertEqual(path[-1], destination)
+                self.assertEqual(
+                    sum(graph.distances[edge] for edge in zip(path, path[1:])),
+                    distance,
+                )
+                self.assertGreater(stats["settled"], 0)
+
+    def test_save_and_load(self):
+        graph = random_graph(30, 90, 0)
+        hierarchy = ContractionHierarchy.build(graph)
+        hierarchy.revision = 7
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "routes.ch")
+            hierarchy.save(path)
+            loaded = ContractionHierarchy.load(path)
+
+        self.assertEqual(loaded.revision, 7)
+        self.assertEqual(
+            loaded.shortest_path("P0", "P5"), hierarchy.shortest_path("P0", "P5")
+        )
+
+
+class CSRGraphTestCase(unittest.TestCase):
+    def test_csr_dijkstra_stats(self):
+        graph = CSRGraph.from_edges(random_edges(30, 90, 0))
+        stats = {}
+        dist, _ = csr_dijkstra(graph, graph.ids["P0"], stats=stats)
+        reached = [node for node in range(len(graph)) if dist[node] != UNREACHED]
+
+        self.assertEqual(stats["settled"], len(reached))
+        self.assertEqual(
+            stats["relaxed"],
+            sum(graph.offsets[node + 1] - graph.offsets[node] for node in reached),
+        )
+
+    def test_csr_shortest_path_matches_dijkstra(self):
+        for seed in range(20):
+            graph = random_graph(30, 90, seed)
+            csr_graph = CSRGraph.from_edges(random_edges(30, 90, seed))
+
+            expected, _ = dijkstra(graph, "P0")
+            for destination, distance in expected.items():
+                if destination == "P0":
+                    continue
+                result, path = get_csr_shortest_path(csr_graph, "P0", destination)
+
+                self.assertEqual(result, distance)
+                self.assertEqual(path[0], "P0")
+                self.assertEqual(path[-1], destination)
+
+    def test_save_and_load_snapshot(self):
+        csr_graph = CSRGraph.from_edges(random_edges(30, 90, 0))
+        csr_graph.revision = 42
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "routes.snapshot")
+            csr_graph.save(path)
+            snapshot = CSRGraph.load(path)
+
+            self.assertEqual(snapshot.revision, 42)
+            for name in csr_graph.names:
+                self.assertEqual(snapshot.has_origin(name), csr_graph.has_origin(name))
+                self.assertEqual(
+                    snapshot.has_destination(name), csr_graph.has_destination(name)
+                )
+            self.assertEqual(sorted(snapshot.names), sorted(csr_graph.names))
+            self.assertEqual(len(snapshot.targets), len(csr_graph.targets))
+            self.assertNotIn("P30", snapshot.ids)
+            for destination in csr_graph.names[1:]:
+                try:
+                    expected = get_csr_shortest_path(csr_graph, "P0", destination)
+                except KeyError:
+                    with self.assertRaises(KeyError):
+                        get_csr_shortest_path(snapshot, "P0", destination)
+                    continue
+                result = get_csr_shortest_path(snapshot, "P0", destination)
+
+                self.assertEqual(result[0], expected[0])
+                self.assertEqual(
+                    snapshot.ids[destination], snapshot.names.index(destination)
+                )
+
+    @clean_db
+    def test_load_csr_graph(self):
+        for origin, destination, distance in [
+            ("A", "B", 10),
+            ("B", "C", 5),
+            ("A", "C", 20),
+        ]:
+            db.session.add(
+                Route(
+                    origin_point=origin,
+                    destination_point=destination,
+                    distance=distance,
+                )
+            )
+        db.session.commit()
+
+        graph = load_csr_graph()
+
+        self.assertEqual(len(graph), 3)
+        self.assertEqual(get_csr_shortest_path(graph, "A", "C"), (15, ["A", "B", "C"]))
+
+
+class RoutingGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rows = [(1, "A", "B", 10), (2, "B", "C", 5)]
+        self.loads = 0
+        self.routing_graph = RoutingGraph(self.load)
+
+    def load(self):
+        self.loads += 1
+        return list(self.rows)
+
+    def test_graph_is_built_once(self):
+        self.routing_graph.get()
+        self.routing_graph.get()
+
+        self.assertEqual(self.loads, 1)
+        self.assertFalse(self.routing_graph.is_stale())
+
+    def test_add_route_patches_graph(self):
+        self.routing_graph.get()
+        self.routing_graph.add_route(3, "C", "D", 1)
+        graph = self.routing_graph.get()
+
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(get_shortest_path(graph, "A", "D"), (16, ["A", "B", "C", "D"]))
+
+    def test_update_and_remove_route_patch_graph(self):
+        self.routing_graph.get()
+        self.routing_graph.update_route(2, "B", "C", 1)
+        graph = self.routing_graph.get()
+
+        self.assertEqual(get_shortest_path(graph, "A", "C"), (11, ["A", "B", "C"]))
+
+        self.routing_graph.remove_route(2)
+        graph = self.routing_graph.get()
+
+        self.assertEqual(self.loads, 1)
+        self.assertFalse(self.routing_graph.has_origin("B"))
+        with self.assertRaises(KeyError):
+            get_shortest_path(graph, "A", "C")
+
+    def test_point_index(self):
+        self.assertTrue(self.routing_graph.has_origin("A"))
+        self.assertFalse(self.routing_graph.has_origin("C"))
+        self.assertTrue(self.routing_graph.has_destination("C"))
+        self.assertFalse(self.routing_graph.has_destination("A"))
+
+        self.routing_graph.add_route(3, "C", "A", 1)
+
+        self.assertTrue(self.routing_graph.has_origin("C"))
+        self.assertTrue(self.routing_graph.has_destination("A"))
+
+    def test_invalidate_marks_graph_stale(self):
+        self.routing_graph.get()
+        self.routing_graph.invalidate()
+
+        self.assertTrue(self.routing_graph.is_stale())
+
+        self.rows.append((3, "A", "C", 1))
+        graph = self.routing_graph.get()
+
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(get_shortest_path(graph, "A", "C"), (1, ["A", "C"]))
+
+
+class RoutingGraphSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rows = [(1, "A", "B", 10), (2, "B", "C", 5)]
+        self.changes = []
+        self.loads = 0
+        self.routing_graph = RoutingGraph(
+            self.load, revision_loader=self.head, changes_loader=self.since
+        )
+        self.routing_graph.get()
+
+    def load(self):
+        self.loads += 1
+        return list(self.rows)
+
+    def head(self):
+        return max([change[0] for change in self.changes], default=0)
+
+    def since(self, revision):
+        return sorted(change for change in self.changes if change[0] > revision)
+
+    def test_sync_applies_changes(self):
+        self.changes += [
+            (1, "insert", 3, "C", "D", 1),
+            (2, "update", 2, "B", "C", 1),
+            (3, "delete", 1, "A", "B", 10),
+        ]
+        graph = self.routing_graph.get()
+
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.routing_graph.revision, 3)
+        self.assertEqual(graph.distances, {("B", "C"): 1, ("C", "D"): 1})
+
+    def test_sync_reloads_after_import(self):
+        self.changes.append((1, "reload", None, None, None, None))
+        self.rows.append((3, "C", "D", 1))
+        graph = self.routing_graph.get()
+
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(self.routing_graph.revision, 1)
+        self.assertEqual(get_shortest_path(graph, "A", "D"), (16, ["A", "B", "C", "D"]))
+
+    def test_sync_applies_late_revisions(self):
+        self.changes.append((2, "insert", 4, "C", "D", 1))
+        self.routing_graph.get()
+        # revision 1 commits after revision 2 was seen
+        self.changes.append((1, "insert", 3, "C", "A", 1))
+        graph = self.routing_graph.get()
+
+        self.assertEqual(self.loads, 1)
+        self.assertIn(("C", "A"), graph.distances)
+        self.assertIn(("C", "D"), graph.distances)
+
+    def test_local_writes_are_not_replayed(self):
+        self.routing_graph.add_route(3, "C", "D", 1, revision=1)
+        generation = self.routing_graph.graph_generation
+        self.changes.append((1, "insert", 3, "C", "D", 1))
+        self.routing_graph.get()
+
+        self.assertEqual(self.routing_graph.revision, 1)
+        self.assertEqual(self.routing_graph.graph_generation, generation)
+
+    def test_sync_reloads_when_too_far_behind(self):
+        self.routing_graph.retention = 2
+        self.changes += [(revision, "insert", 3, "C", "D", 1) for revision in (1, 2, 3)]
+        self.rows.append((3, "C", "D", 1))
+        self.routing_graph.get()
+
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(self.routing_graph.revision, 3)
+
+    def test_sync_interval(self):
+        self.routing_graph.sync_interval = 60
+        self.changes.append((1, "insert", 3, "C", "D", 1))
+        graph = self.routing_graph.get()
+
+        self.assertNotIn(("C", "D"), graph.distances)
+
+
+class BackgroundBuildTestCase(unittest.TestCase):
+    def test_value_is_rebuilt_for_each_generation(self):
+        graph = Graph()
+        graph.add_edge("A", "B", 10)
+        background = BackgroundBuild(len)
+
+        self.assertIsNone(background.get(graph, 1))
+        background.wait()
+        self.assertEqual(background.get(graph, 1), 1)
+
+        graph.add_edge("B", "C", 5)
+
+        self.assertIsNone(background.get(graph, 2))
+        background.wait()
+        self.assertEqual(background.get(graph, 2), 2)
+
+
+class PathCacheTestCase(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PathCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(
+            cache.stats(),
+            {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "evictions": 1},
+        )
+
+    def test_disabled_cache(self):
+        cache = PathCache(0)
+        cache.set("a", 1)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_disabled(self):
+        registry = Metrics()
+        with registry.span("search"):
+            pass
+        registry.count_search(registry.search_stats(), "dijkstra")
+
+        self.assertIsNone(registry.search_stats())
+        self.assertIn("# TYPE routes_api_searches_total counter", registry.render())
+        self.assertNotIn("routes_api_searches_total{", registry.render())
+        self.assertNotIn("_bucket", registry.render())
+
+    def test_render(self):
+        registry = Metrics(enabled=True)
+        registry.observe("routes_api_span_seconds", "search", 0.003)
+        registry.observe("routes_api_span_seconds", "search", 2)
+        registry.count_search({"settled": 5, "relaxed": 9}, "dijkstra")
+        registry.count_search({}, "table")
+        registry.count_search({}, "csr", 3)
+        result = registry.render()
+
+        for line in (
+            "# TYPE routes_api_span_seconds histogram",
+            'routes_api_span_seconds_bucket{span="search",le="0.0025"} 0',
+            'routes_api_span_seconds_bucket{span="search",le="0.005"} 1',
+            'routes_api_span_seconds_bucket{span="search",le="2.5"} 2',
+            'routes_api_span_seconds_bucket{span="search",le="+Inf"} 2',
+            'routes_api_span_seconds_sum{span="search"} 2.003',
+            'routes_api_span_seconds_count{span="search"} 2',
+            "# TYPE routes_api_searches_total counter",
+            'routes_api_searches_total{engine="csr"} 3',
+            'routes_api_searches_total{engine="dijkstra"} 1',
+            'routes_api_searches_total{engine="table"} 1',
+            'routes_api_search_settled_total{engine="dijkstra"} 5',
+            'routes_api_search_relaxed_total{engine="dijkstra"} 9',
+        ):
+            self.assertIn(line + "\n", result)
+        # engines that report no counts have none
+        self.assertNotIn('settled_total{engine="table"}', result)
+
+
+class SchemaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.schema = Schema(
+            Field("name", str, required=True),
+            Field("distance", integer_field),
+            Field("limit", positive_integer_field, location="args"),
+        )
+
+    def parse(self, path="/", body=None):
+        with app.test_request_context(path, method="POST", json=body):
+            return self.schema.parse()
+
+    def abort_message(self, path="/", body=None):
+        with self.assertRaises(HTTPException) as context:
+            self.parse(path, body)
+        self.assertEqual(context.exception.code, 400)
+        return context.exception.data["message"]
+
+    def test_parse(self):
+        result = self.parse("/?limit=5&limit=7", {"name": 1, "distance": 10})
+
+        self.assertEqual(result, {"name": "1", "distance": 10, "limit": 5})
+
+    def test_missing_and_null_fields(self):
+        self.assertEqual(
+            self.parse(body={"name": None}),
+            {"name": None, "distance": None, "limit": None},
+        )
+        self.assertEqual(
+            self.abort_message(body={"distance": 10}),
+            {"name": "Missing required parameter in the JSON body"},
+        )
+
+    def test_invalid_fields(self):
+        self.assertEqual(
+            self.abort_message(body={"name": "A", "distance": "ABC"}),
+            {"distance": "Value 'ABC' for field 'distance' is not a valid integer."},
+        )
+        self.assertEqual(
+            self.abort_message("/?limit=2&limit=x", {"name": "A"}),
+            {"limit": "Value for field 'limit' is not a valid positive integer."},
+        )
+
+
 class RouteApiTestCase(unittest.TestCase):
     def setUp(self):
         with app.app_context():
@@ -40,10 +852,15 @@ class RouteApiTestCase(unittest.TestCase):
             app.config[
                 "SQL_ALCHEMY_DATABASE_URI"
             ] = "postgresql://localhost/routes_api_python_test"
+            # the all-pairs table is built in the background; tests that
+            # want it turn it on and wait for it
+            self.all_pairs_max_nodes = app.config["ALL_PAIRS_MAX_NODES"]
+            app.config["ALL_PAIRS_MAX_NODES"] = 0
             self.app = app.test_client()
             db.create_all()
 
     def tearDown(self):
+        app.config["ALL_PAIRS_MAX_NODES"] = self.all_pairs_max_nodes
         with app.app_context():
             db.session.remove()
             db.drop_all()
@@ -74,6 +891,43 @@ class RoutesApiTestCase(RouteApiTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected)
 
+    @clean_db
+    def test_route_json_is_unchanged(self):
+        route_fields = {
+            "origin_point": fields.String,
+            "destination_point": fields.String,
+            "distance": fields.Integer,
+            "uri": fields.Url("route"),
+        }
+        for origin, destination in (("A", "B"), ('S\u00e3o "Paulo"', "C\\%d")):
+            db.session.add(
+                Route(origin_point=origin, destination_point=destination, distance=7)
+            )
+        db.session.commit()
+
+        previous = app.debug
+        for debug in (False, True):
+            app.debug = debug
+            try:
+                with app.test_request_context("/routes"):
+                    routes = [marshal(route, route_fields) for route in Route.query]
+                    route = marshal(Route.query.get(2), route_fields)
+                response = self.app.get("/routes")
+                route_response = self.app.get("/routes/2")
+            finally:
+                app.debug = previous
+            indent = 4 if debug else None
+
+            self.assertEqual(
+                response.data.decode("utf-8"),
+                json.dumps({"routes": routes}, indent=indent) + "\n",
+            )
+            self.assertEqual(
+                route_response.data.decode("utf-8"),
+                json.dumps({"route": route}, indent=indent) + "\n",
+            )
+            self.assertEqual(response.headers["Content-Type"], "application/json")
+
     @clean_db
     def test_show_all_routes(self):
         route = Route(origin_point="A", destination_point="B", distance=10)
@@ -96,6 +950,189 @@ class RoutesApiTestCase(RouteApiTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected)
 
+    @clean_db
+    def test_paginate_routes(self):
+        for distance in range(1, 6):
+            db.session.add(
+                Route(origin_point="A", destination_point="B", distance=distance)
+            )
+        db.session.commit()
+
+        response = self.app.get("/routes?limit=2")
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([route["distance"] for route in result["routes"]], [1, 2])
+        self.assertEqual(result["next"], "/routes?limit=2&after=2")
+
+        response = self.app.get("/routes?limit=2&after=4")
+        result = response.get_json()
+
+        self.assertEqual([route["distance"] for route in result["routes"]], [5])
+        self.assertIsNone(result["next"])
+
+    def test_paginate_routes_with_invalid_limit(self):
+        response = self.app.get("/routes?limit=0")
+        expected = "Value for field 'limit' is not a valid positive integer."
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+    @clean_db
+    def test_stream_routes(self):
+        for distance in range(1, 4):
+            db.session.add(
+                Route(origin_point="A", destination_point="B", distance=distance)
+            )
+        db.session.commit()
+
+        response = self.app.get("/routes?stream=ndjson&after=1")
+        result = [
+            json.loads(line) for line in response.data.decode("utf-8").splitlines()
+        ]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(
+            result,
+            [
+                {
+                    "origin_point": "A",
+                    "destination_point": "B",
+                    "distance": 2,
+                    "uri": "/routes/2",
+                },
+                {
+                    "origin_point": "A",
+                    "destination_point": "B",
+                    "distance": 3,
+                    "uri": "/routes/3",
+                },
+            ],
+        )
+
+        response = self.app.get("/routes?stream=json")
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [route["uri"] for route in result["routes"]],
+            ["/routes/1", "/routes/2", "/routes/3"],
+        )
+
+    @clean_db
+    def test_import_routes_from_csv(self):
+        app.config["IMPORT_BATCH_SIZE"] = 2
+        data = "origin_point,destination_point,distance\nA,B,10\nB,C,5\nA,C,20\n"
+
+        try:
+            response = self.app.post(
+                "/routes/import", data=data, content_type="text/csv"
+            )
+        finally:
+            app.config["IMPORT_BATCH_SIZE"] = 10000
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            result["batches"],
+            [{"received": 2, "inserted": 2}, {"received": 1, "inserted": 1}],
+        )
+        self.assertEqual(result["inserted"], 3)
+        self.assertEqual(Route.query.count(), 3)
+
+    @clean_db
+    def test_route_revisions_are_pruned(self):
+        db.session.execute(
+            RouteRevision.__table__.insert(),
+            [{"action": "insert", "route_pk": 1} for _ in range(1999)],
+        )
+        app.config["REVISION_RETENTION"] = 10
+        try:
+            revision = RouteRevision.record("delete")
+        finally:
+            app.config["REVISION_RETENTION"] = 100000
+        db.session.commit()
+
+        # workers 10 revisions behind still await up to 1000 more below them
+        self.assertEqual(revision, 2000)
+        self.assertEqual(db.session.query(db.func.min(RouteRevision.pk)).scalar(), 991)
+        self.assertEqual(RouteRevision.query.count(), 1010)
+
+    @clean_db
+    def test_bulk_import_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "routes.csv")
+            with open(path, "w") as handle:
+                handle.write("origin_point,destination_point,distance\nA,B,10\nB,C,x\n")
+
+            result = app.test_cli_runner().invoke(
+                manage.bulk_import, args=[path, "--batch-size", "1"]
+            )
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            result.output.splitlines(),
+            [
+                "batch 1: 1 received, 1 inserted",
+                "line 3: Value 'x' for field 'distance' is not a valid integer.",
+                "1 inserted, 1 rejected",
+            ],
+        )
+        self.assertEqual(Route.query.count(), 1)
+
+    def test_copy_buffer_keeps_empty_point_names(self):
+        buffer = copy_buffer([("", "B", 3), ('A "1"', "", 4)])
+
+        # an unquoted empty field would be NULL to COPY
+        self.assertEqual(buffer.read(), '"","B","3"\r\n"A ""1""","","4"\r\n')
+        buffer.seek(0)
+        self.assertEqual(list(csv.reader(buffer)), [["", "B", "3"], ['A "1"', "", "4"]])
+
+    @clean_db
+    def test_import_routes_from_ndjson(self):
+        db.session.add(Route(origin_point="A", destination_point="B", distance=10))
+        db.session.commit()
+        data = "\n".join(
+            [
+                '{"origin_point": "A", "destination_point": "B", "distance": 10}',
+                '{"origin_point": "B", "destination_point": "C", "distance": "ABC"}',
+                '{"origin_point": "B", "distance": 5}',
+                "not json",
+                '{"origin_point": "B", "destination_point": "C", "distance": 5}',
+            ]
+        )
+
+        response = self.app.post(
+            "/routes/import", data=data, content_type="application/x-ndjson"
+        )
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result["batches"], [{"received": 2, "inserted": 1}])
+        self.assertEqual(result["rejected"], 3)
+        self.assertEqual(
+            result["errors"],
+            [
+                {
+                    "line": 2,
+                    "error": "Value 'ABC' for field 'distance' is not a valid integer.",
+                },
+                {"line": 3, "error": "Missing required parameter 'destination_point'."},
+                {"line": 4, "error": "Row is not a valid object."},
+            ],
+        )
+        self.assertEqual(Route.query.count(), 2)
+
+    def test_import_routes_with_unsupported_content_type(self):
+        response = self.app.post("/routes/import", data="", content_type="text/plain")
+        expected = "Unsupported content type 'text/plain'"
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 415)
+        self.assertIn(expected, result)
+
     @clean_db
     def test_create_route(self):
         route = {"origin_point": "A", "destination_point": "C", "distance": 20}
@@ -292,19 +1329,269 @@ class RoutesApiTestCase(RouteApiTestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn(expected, result)
 
+    def test_route_etag(self):
+        response = self.app.post(
+            "/routes",
+            data=json.dumps(
+                {"origin_point": "A", "destination_point": "B", "distance": 10}
+            ),
+            content_type="application/json",
+        )
+        etag, _ = response.get_etag()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(etag)
+        self.assertEqual(self.app.get("/routes/1").get_etag(), (etag, False))
+
+        response = self.app.put(
+            "/routes/1",
+            data=json.dumps({"distance": 20}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get_etag()[0], etag)
+        self.assertEqual(self.app.get("/routes/1").get_etag(), response.get_etag())
+
+    @clean_db
+    def test_update_bumps_updated_at(self):
+        route = Route(
+            origin_point="A",
+            destination_point="B",
+            distance=10,
+            updated_at=datetime.datetime(2020, 1, 1),
+        )
+        db.session.add(route)
+        db.session.commit()
+
+        self.app.put(
+            "/routes/{}".format(route.pk),
+            data=json.dumps({"distance": 20}),
+            content_type="application/json",
+        )
+        db.session.expire_all()
+
+        self.assertGreater(
+            Route.query.get(route.pk).updated_at, datetime.datetime(2020, 1, 1)
+        )
+
+    def test_update_route_if_match(self):
+        self.app.post(
+            "/routes",
+            data=json.dumps(
+                {"origin_point": "A", "destination_point": "B", "distance": 10}
+            ),
+            content_type="application/json",
+        )
+        etag, _ = self.app.get("/routes/1").get_etag()
+        data = json.dumps({"distance": 20})
+
+        response = self.app.put(
+            "/routes/1",
+            data=data,
+            content_type="application/json",
+            headers={"If-Match": '"{}"'.format(etag)},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["route"]["distance"], 20)
+
+        # the route changed since that version
+        response = self.app.put(
+            "/routes/1",
+            data=json.dumps({"distance": 30}),
+            content_type="application/json",
+            headers={"If-Match": '"{}"'.format(etag)},
+        )
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.get_json(), {"error": "Route 1 has changed."})
+        self.assertEqual(self.app.get("/routes/1").get_json()["route"]["distance"], 20)
+
+        response = self.app.put(
+            "/routes/1",
+            data=json.dumps({"distance": 30}),
+            content_type="application/json",
+            headers={"If-Match": "*"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        response = self.app.put(
+            "/routes/123",
+            data=data,
+            content_type="application/json",
+            headers={"If-Match": "*"},
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_route_if_match(self):
+        self.app.post(
+            "/routes",
+            data=json.dumps(
+                {"origin_point": "A", "destination_point": "B", "distance": 10}
+            ),
+            content_type="application/json",
+        )
+        etag, _ = self.app.get("/routes/1").get_etag()
+
+        response = self.app.delete("/routes/1", headers={"If-Match": '"invalid"'})
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.app.get("/routes/1").status_code, 200)
+
+        response = self.app.delete(
+            "/routes/1", headers={"If-Match": '"{}"'.format(etag)}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.app.get("/routes/1").status_code, 404)
+
+    def test_route_writes_without_if_match(self):
+        self.app.post(
+            "/routes",
+            data=json.dumps(
+                {"origin_point": "A", "destination_point": "B", "distance": 10}
+            ),
+            content_type="application/json",
+        )
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if " routes" in statement:
+                statements.append(statement.split()[0])
+
+        with app.app_context():
+            engine = db.engine
+        sqlalchemy.event.listen(engine, "before_cursor_execute", count)
+        try:
+            response = self.app.put(
+                "/routes/1",
+                data=json.dumps({"distance": 20}),
+                content_type="application/json",
+            )
+            updates, statements[:] = list(statements), []
+            self.app.delete("/routes/1")
+            deletes, statements[:] = list(statements), []
+            self.app.delete("/routes/1")
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", count)
+
+        self.assertEqual(response.get_json()["route"]["distance"], 20)
+        self.assertEqual(updates, ["UPDATE", "SELECT"])
+        self.assertEqual(deletes, ["SELECT", "DELETE"])
+        self.assertEqual(statements, ["SELECT"])
+
+    def test_route_writes_with_returning_on_sqlite(self):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if " routes" in statement:
+                statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        sqlalchemy.event.listen(engine, "before_cursor_execute", count)
+        try:
+            with sqlite_returning():
+                response = self.app.post(
+                    "/routes",
+                    json={
+                        "origin_point": "A",
+                        "destination_point": "B",
+                        "distance": 10,
+                    },
+                )
+                etag, _ = response.get_etag()
+                response = self.app.put(
+                    "/routes/1",
+                    json={"distance": 20},
+                    headers={"If-Match": '"{}"'.format(etag)},
+                )
+                stale = self.app.put(
+                    "/routes/1",
+                    json={"distance": 30},
+                    headers={"If-Match": '"{}"'.format(etag)},
+                )
+                deleted = self.app.delete(
+                    "/routes/1",
+                    headers={"If-Match": '"{}"'.format(response.get_etag()[0])},
+                )
+        finally:
+            sqlalchemy.event.remove(engine, "before_cursor_execute", count)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["route"]["distance"], 20)
+        self.assertNotEqual(response.get_etag()[0], etag)
+        self.assertEqual(stale.status_code, 412)
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(self.app.get("/routes/1").status_code, 404)
+        # each write is one statement, and a stale one is told apart from a
+        # missing route by loading it
+        self.assertEqual(
+            [statement.split()[0] for statement in statements],
+            ["INSERT", "UPDATE", "UPDATE", "SELECT", "DELETE"],
+        )
+        self.assertTrue(
+            all(
+                "RETURNING" in statement
+                for statement in statements
+                if not statement.startswith("SELECT")
+            )
+        )
+
+    def test_route_writes_with_returning(self):
+        if_match = parse_etags('"2020-01-01T00:00:00", "invalid"')
+        table = Route.__table__
+
+        def compile(statement):
+            return str(statement.compile(dialect=postgresql.dialect()))
+
+        update = compile(
+            version_filter(table.update().values(distance=20), 1, if_match).returning(
+                *ROUTE_COLUMNS
+            )
+        )
+        delete = compile(
+            version_filter(table.delete(), 1, parse_etags("*")).returning(
+                *ROUTE_COLUMNS
+            )
+        )
+
+        self.assertIn("WHERE routes.pk = %(pk_1)s AND routes.updated_at IN", update)
+        self.assertIn("RETURNING routes.pk", update)
+        self.assertIn("routes.updated_at", update.split("RETURNING")[1])
+        self.assertIn("WHERE routes.pk = %(pk_1)s RETURNING routes.pk", delete)
+        self.assertNotIn("updated_at IN", delete)
+        # only well-formed versions are compared
+        self.assertEqual(
+            version_filter(table.update(), 1, if_match)
+            .compile(dialect=postgresql.dialect())
+            .params["updated_at_1"],
+            [datetime.datetime(2020, 1, 1)],
+        )
+
+
+class RouteFixtureTestCase(unittest.TestCase):
+    """Routes A to E for the calculation tests; it has no tests of its own."""
 
-class RouteCalculateCostApiTestCase(RouteApiTestCase):
     def setUp(self):
         with app.app_context():
             app.config["TESTING"] = True
             app.config[
                 "SQL_ALCHEMY_DATABASE_URI"
             ] = "postgresql://localhost/routes_api_python_test"
+            # the all-pairs table is built in the background; tests that
+            # want it turn it on and wait for it
+            self.all_pairs_max_nodes = app.config["ALL_PAIRS_MAX_NODES"]
+            app.config["ALL_PAIRS_MAX_NODES"] = 0
             self.app = app.test_client()
             db.create_all()
 
             # routes
             self._create_routes()
+            routing_graph.invalidate()
 
     def _create_routes(self):
         # routes
@@ -322,6 +1609,14 @@ class RouteCalculateCostApiTestCase(RouteApiTestCase):
 
         db.session.commit()
 
+    def tearDown(self):
+        app.config["ALL_PAIRS_MAX_NODES"] = self.all_pairs_max_nodes
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+class RouteCalculateCostApiTestCase(RouteFixtureTestCase):
     def test_calculate_cost(self):
         data = {
             "origin_point": "A",
@@ -342,38 +1637,407 @@ class RouteCalculateCostApiTestCase(RouteApiTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(result, expected)
 
-    def test_calculate_cost_with_invalid_data(self):
+    def test_calculate_cost_after_creating_route(self):
         data = {
             "origin_point": "A",
             "destination_point": "D",
-            "autonomy": "ABC",
+            "autonomy": 10,
             "fuel_price": 2.5,
         }
+        self.app.post("/routes/calculate-cost", json=data)
 
-        data = json.dumps(data)
+        route = {"origin_point": "A", "destination_point": "D", "distance": 5}
+        self.app.post("/routes", json=route)
 
-        response = self.app.post(
-            "/routes/calculate-cost", data=data, content_type="application/json"
-        )
-        expected = "Value 'ABC' for field 'autonomy' is not a valid integer."
-        result = response.data.decode("utf-8")
+        response = self.app.post("/routes/calculate-cost", json=data)
+        result = response.get_json()
 
-        self.assertEqual(response.status_code, 400)
-        self.assertIn(expected, result)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, {"cost": 1.25, "path": "A D"})
 
-    def test_calculate_cost_with_invalid_fuel_price_data(self):
+    def test_calculate_cost_after_updating_route(self):
         data = {
             "origin_point": "A",
             "destination_point": "D",
             "autonomy": 10,
-            "fuel_price": "XYZ",
+            "fuel_price": 2.5,
         }
+        self.app.post("/routes/calculate-cost", json=data)
 
-        data = json.dumps(data)
+        # A -> B becomes longer than A -> C -> D
+        self.app.put("/routes/1", json={"distance": 40})
 
-        response = self.app.post(
-            "/routes/calculate-cost", data=data, content_type="application/json"
-        )
+        response = self.app.post("/routes/calculate-cost", json=data)
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, {"cost": 12.5, "path": "A C D"})
+
+    def test_calculate_cost_after_deleting_route(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        self.app.post("/routes/calculate-cost", json=data)
+
+        # A -> B
+        self.app.delete("/routes/1")
+
+        response = self.app.post("/routes/calculate-cost", json=data)
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, {"cost": 12.5, "path": "A C D"})
+
+    def test_calculate_cost_after_writes_on_another_worker(self):
+        worker = RoutingGraph(
+            load_routes, revision_loader=load_revision, changes_loader=load_changes
+        )
+        with app.app_context():
+            worker.get()
+
+        # A -> B becomes longer than A -> C -> D, C -> E is added
+        self.app.put("/routes/1", json={"distance": 40})
+        route = {"origin_point": "C", "destination_point": "E", "distance": 5}
+        self.app.post("/routes", json=route)
+
+        with app.app_context():
+            graph = worker.get()
+
+        self.assertEqual(worker.revision, 2)
+        self.assertEqual(get_shortest_path(graph, "A", "D"), (50, ["A", "C", "D"]))
+        self.assertEqual(get_shortest_path(graph, "A", "E"), (25, ["A", "C", "E"]))
+
+    def test_calculate_cost_with_all_pairs_table(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+        app.config["ALL_PAIRS_MAX_NODES"] = 2000
+        try:
+            # the first query starts the build and falls back to Dijkstra
+            response = self.app.post("/routes/calculate-cost", json=data)
+            all_pairs.wait()
+
+            self.assertEqual(response.get_json(), {"cost": 11.0, "path": "A B D E"})
+            with app.app_context():
+                graph = routing_graph.get()
+                self.assertEqual(len(get_all_pairs(graph)), 5)
+
+            response = self.app.post("/routes/calculate-cost", json=data)
+
+            self.assertEqual(response.get_json(), {"cost": 11.0, "path": "A B D E"})
+
+            # writes make the table stale until it is rebuilt
+            route = {"origin_point": "A", "destination_point": "E", "distance": 5}
+            self.app.post("/routes", json=route)
+            response = self.app.post("/routes/calculate-cost", json=data)
+            all_pairs.wait()
+
+            self.assertEqual(response.get_json(), {"cost": 1.0, "path": "A E"})
+            with app.app_context():
+                graph = routing_graph.get()
+                self.assertEqual(get_all_pairs(graph).distance_row("A", ["E"]), [5])
+        finally:
+            app.config["ALL_PAIRS_MAX_NODES"] = 0
+
+    def test_calculate_cost_is_cached(self):
+        path_cache.clear()
+        stats = path_cache.stats()
+        data = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        self.app.post("/routes/calculate-cost", json=data)
+
+        # cost is not cached, only distance and path
+        data["fuel_price"] = 5.0
+        response = self.app.post("/routes/calculate-cost", json=data)
+        result = response.get_json()
+
+        self.assertEqual(result, {"cost": 12.5, "path": "A B D"})
+
+        response = self.app.get("/routes/calculate-cost/cache")
+        result = response.get_json()["cache"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result["size"], 1)
+        self.assertEqual(result["hits"] - stats["hits"], 1)
+        self.assertEqual(result["misses"] - stats["misses"], 1)
+
+    def test_calculate_cost_with_bidirectional_engine(self):
+        app.config["ROUTING_ENGINE"] = "bidirectional"
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+
+        try:
+            response = self.app.post("/routes/calculate-cost", json=data)
+        finally:
+            app.config["ROUTING_ENGINE"] = "dijkstra"
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, {"cost": 11.0, "path": "A B D E"})
+
+    def test_calculate_cost_with_astar_engine(self):
+        points = [("A", 0, 0), ("B", 8, 0), ("C", 0, 15), ("D", 20, 0), ("E", 30, 0)]
+        with app.app_context():
+            for name, x, y in points:
+                db.session.add(Point(name=name, latitude=x, longitude=y))
+            db.session.commit()
+        routing_graph.invalidate()
+
+        app.config["ROUTING_ENGINE"] = "astar_euclidean"
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+
+        try:
+            response = self.app.post("/routes/calculate-cost", json=data)
+        finally:
+            app.config["ROUTING_ENGINE"] = "dijkstra"
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, {"cost": 11.0, "path": "A B D E"})
+
+    def test_calculate_cost_with_hierarchy_engine(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            app.config["ROUTING_ENGINE"] = "ch"
+            app.config["CH_PATH"] = os.path.join(directory, "routes.ch")
+            try:
+                with app.app_context():
+                    hierarchy = build_hierarchy(app.config["CH_PATH"])
+
+                    self.assertEqual(hierarchy.revision, load_revision())
+
+                response = self.app.post("/routes/calculate-cost", json=data)
+                result = response.get_json()
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(result, {"cost": 11.0, "path": "A B D E"})
+
+                # the hierarchy no longer matches the network, so it is skipped
+                route = {"origin_point": "A", "destination_point": "E", "distance": 5}
+                self.app.post("/routes", json=route)
+                response = self.app.post("/routes/calculate-cost", json=data)
+                result = response.get_json()
+
+                self.assertEqual(result, {"cost": 1.0, "path": "A E"})
+            finally:
+                app.config["ROUTING_ENGINE"] = "dijkstra"
+
+    def test_calculate_cost_with_snapshot_engine(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            app.config["ROUTING_ENGINE"] = "csr"
+            app.config["SNAPSHOT_PATH"] = os.path.join(directory, "routes.snapshot")
+            try:
+                with app.app_context():
+                    snapshot = build_snapshot(app.config["SNAPSHOT_PATH"])
+
+                    self.assertEqual(snapshot.revision, load_revision())
+                routing_graph.invalidate()
+
+                response = self.app.post("/routes/calculate-cost", json=data)
+                result = response.get_json()
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(result, {"cost": 11.0, "path": "A B D E"})
+
+                response = self.app.post(
+                    "/routes/calculate-cost", json=dict(data, destination_point="Z")
+                )
+
+                self.assertEqual(response.status_code, 400)
+                # points are validated and searched on the snapshot alone
+                self.assertTrue(routing_graph.is_stale())
+
+                # the snapshot no longer matches the network, so it is skipped
+                route = {"origin_point": "A", "destination_point": "E", "distance": 5}
+                self.app.post("/routes", json=route)
+                response = self.app.post("/routes/calculate-cost", json=data)
+                result = response.get_json()
+
+                self.assertEqual(result, {"cost": 1.0, "path": "A E"})
+            finally:
+                app.config["ROUTING_ENGINE"] = "dijkstra"
+
+    def assertReadable(self, path):
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~umask)
+
+    def test_rebuild_hierarchy_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "routes.ch")
+            app.config["CH_PATH"] = path
+
+            # inside an app context, the CLI keeps the app's debug flag
+            with app.app_context():
+                result = app.test_cli_runner().invoke(args=["rebuild_hierarchy"])
+
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(result.output, "Contracted 5 points into %s\n" % path)
+            self.assertReadable(path)
+            with app.app_context():
+                hierarchy = hierarchy_file.get(path)
+
+                self.assertEqual(hierarchy.revision, load_revision())
+                self.assertEqual(
+                    hierarchy.shortest_path("A", "E"), (55, ["A", "B", "D", "E"])
+                )
+
+    def test_rebuild_snapshot_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "routes.snapshot")
+            app.config["SNAPSHOT_PATH"] = path
+
+            # inside an app context, the CLI keeps the app's debug flag
+            with app.app_context():
+                result = app.test_cli_runner().invoke(args=["rebuild_snapshot"])
+
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(
+                result.output, "Wrote 5 points and 6 routes to %s\n" % path
+            )
+            self.assertReadable(path)
+            with app.app_context():
+                snapshot = snapshot_file.get(path)
+
+                self.assertEqual(snapshot.revision, load_revision())
+                self.assertEqual(
+                    get_csr_shortest_path(snapshot, "A", "E"),
+                    (55, ["A", "B", "D", "E"]),
+                )
+
+    def test_calculate_cost_without_queries(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        self.app.post("/routes/calculate-cost", json=data)
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        sqlalchemy.event.listen(engine, "before_cursor_execute", count)
+        # keep the change feed poll out of the way
+        sync_interval, routing_graph.sync_interval = routing_graph.sync_interval, 60
+        try:
+            data["destination_point"] = "E"
+            response = self.app.post("/routes/calculate-cost", json=data)
+            data["origin_point"] = "Y"
+            self.app.post("/routes/calculate-cost", json=data)
+        finally:
+            routing_graph.sync_interval = sync_interval
+            sqlalchemy.event.remove(engine, "before_cursor_execute", count)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, [])
+
+    def test_calculate_cost_alternatives(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+            "k": 3,
+        }
+
+        response = self.app.post("/routes/calculate-cost", json=data)
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            result,
+            {
+                "paths": [
+                    {"cost": 11.0, "path": "A B D E"},
+                    {"cost": 12.0, "path": "A B E"},
+                    {"cost": 16.0, "path": "A C D E"},
+                ]
+            },
+        )
+
+    def test_calculate_cost_alternatives_with_invalid_k(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+            "k": 11,
+        }
+
+        response = self.app.post("/routes/calculate-cost", json=data)
+        expected = "Value '11' for field 'k' is not an integer between 1 and 10."
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, response.data.decode("utf-8"))
+
+    def test_calculate_cost_with_invalid_data(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": "ABC",
+            "fuel_price": 2.5,
+        }
+
+        data = json.dumps(data)
+
+        response = self.app.post(
+            "/routes/calculate-cost", data=data, content_type="application/json"
+        )
+        expected = "Value 'ABC' for field 'autonomy' is not a valid integer."
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+    def test_calculate_cost_with_invalid_fuel_price_data(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": "XYZ",
+        }
+
+        data = json.dumps(data)
+
+        response = self.app.post(
+            "/routes/calculate-cost", data=data, content_type="application/json"
+        )
         expected = "Value 'XYZ' for field 'fuel_price' is not a valid float."
         result = response.data.decode("utf-8")
 
@@ -433,6 +2097,517 @@ class RouteCalculateCostApiTestCase(RouteApiTestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn(expected, result)
 
+    def test_metrics(self):
+        metrics.enabled = metrics.server_timing = True
+        metrics.clear()
+        path_cache.clear()
+        try:
+            data = {
+                "origin_point": "A",
+                "destination_point": "D",
+                "autonomy": 10,
+                "fuel_price": 2.5,
+            }
+            response = self.app.post("/routes/calculate-cost", json=data)
+            timings = response.headers["Server-Timing"]
+            result = self.app.get("/metrics")
+        finally:
+            metrics.enabled = metrics.server_timing = False
+            metrics.clear()
+
+        for span in ("parse", "validate", "graph", "search"):
+            self.assertIn(span + ";dur=", timings)
+
+        text = result.data.decode("utf-8")
+        self.assertEqual(result.status_code, 200)
+        self.assertTrue(result.content_type.startswith("text/plain"))
+        self.assertIn(
+            'routes_api_request_seconds_count{endpoint="route_calculate_cost"} 1',
+            text,
+        )
+        self.assertIn('routes_api_span_seconds_count{span="search"} 1', text)
+        self.assertIn('routes_api_searches_total{engine="dijkstra"} 1', text)
+        self.assertNotIn('routes_api_search_settled_total{engine="dijkstra"} 0', text)
+
+    def test_metrics_count_every_engine(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+        metrics.enabled = True
+        metrics.clear()
+        path_cache.clear()
+        try:
+            with snapshot_engine():
+                self.app.post("/routes/calculate-cost", json=data)
+
+            with tempfile.TemporaryDirectory() as directory:
+                app.config["ROUTING_ENGINE"] = "ch"
+                app.config["CH_PATH"] = os.path.join(directory, "routes.ch")
+                try:
+                    with app.app_context():
+                        build_hierarchy(app.config["CH_PATH"])
+                    self.app.post("/routes/calculate-cost", json=data)
+                finally:
+                    app.config["ROUTING_ENGINE"] = "dijkstra"
+
+            # the first query builds the table and falls back to Dijkstra
+            path_cache.clear()
+            app.config["ALL_PAIRS_MAX_NODES"] = 2000
+            self.app.post("/routes/calculate-cost", json=data)
+            all_pairs.wait()
+            self.app.post("/routes/calculate-cost", json=data)
+            text = metrics.render()
+        finally:
+            metrics.enabled = False
+            metrics.clear()
+            path_cache.clear()
+
+        for engine in ("csr", "ch", "table", "dijkstra"):
+            self.assertIn(
+                'routes_api_searches_total{{engine="{}"}} 1'.format(engine), text
+            )
+        for engine in ("csr", "ch"):
+            self.assertRegex(
+                text,
+                r'routes_api_search_settled_total\{{engine="{}"\}} [1-9]'.format(
+                    engine
+                ),
+            )
+
+    def test_no_server_timing_by_default(self):
+        data = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        response = self.app.post("/routes/calculate-cost", json=data)
+
+        self.assertNotIn("Server-Timing", response.headers)
+
+
+class RouteBatchCalculateCostApiTestCase(RouteFixtureTestCase):
+    def test_calculate_cost_batch(self):
+        data = {
+            "items": [
+                {
+                    "origin_point": "A",
+                    "destination_point": "D",
+                    "autonomy": 10,
+                    "fuel_price": 2.5,
+                },
+                {
+                    "origin_point": "A",
+                    "destination_point": "E",
+                    "autonomy": 5,
+                    "fuel_price": 2.0,
+                },
+                {
+                    "origin_point": "C",
+                    "destination_point": "E",
+                    "autonomy": 10,
+                    "fuel_price": 1.0,
+                },
+            ]
+        }
+        expected = {
+            "results": [
+                {"cost": 6.25, "path": "A B D"},
+                {"cost": 22.0, "path": "A B D E"},
+                {"cost": 6.0, "path": "C D E"},
+            ]
+        }
+
+        response = self.app.post("/routes/calculate-cost/batch", json=data)
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, expected)
+
+    def test_calculate_cost_batch_in_parallel(self):
+        with parallel_searches():
+            self.test_calculate_cost_batch()
+
+    def test_calculate_cost_batch_with_snapshot_engine(self):
+        with snapshot_engine():
+            self.test_calculate_cost_batch()
+
+    def test_calculate_cost_batch_with_invalid_items(self):
+        data = {
+            "items": [
+                {
+                    "origin_point": "A",
+                    "destination_point": "D",
+                    "autonomy": "ABC",
+                    "fuel_price": 2.5,
+                },
+                {"origin_point": "A", "autonomy": 10, "fuel_price": 2.5},
+                {
+                    "origin_point": "Y",
+                    "destination_point": "D",
+                    "autonomy": 10,
+                    "fuel_price": 2.5,
+                },
+                {
+                    "origin_point": "A",
+                    "destination_point": "X",
+                    "autonomy": 10,
+                    "fuel_price": 2.5,
+                },
+                {
+                    "origin_point": "D",
+                    "destination_point": "B",
+                    "autonomy": 10,
+                    "fuel_price": 2.5,
+                },
+                {
+                    "origin_point": "A",
+                    "destination_point": "B",
+                    "autonomy": 10,
+                    "fuel_price": 2.5,
+                },
+            ]
+        }
+        expected = {
+            "results": [
+                {"error": "Value 'ABC' for field 'autonomy' is not a valid integer."},
+                {"error": "Missing required parameter 'destination_point'."},
+                {"error": "Origin point 'Y' not found"},
+                {"error": "Destination point 'X' not found"},
+                {"error": "No route from 'D' to 'B'"},
+                {"cost": 2.5, "path": "A B"},
+            ]
+        }
+
+        response = self.app.post("/routes/calculate-cost/batch", json=data)
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(result, expected)
+
+    def test_calculate_cost_batch_with_missing_items(self):
+        response = self.app.post("/routes/calculate-cost/batch", json={})
+        expected = "Missing required parameter in the JSON body"
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+
+class RouteCostMatrixApiTestCase(RouteFixtureTestCase):
+    def test_calculate_cost_matrix(self):
+        data = {
+            "origins": ["A", "B", "D"],
+            "destinations": ["B", "D", "E"],
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+        expected = {
+            "origins": ["A", "B", "D"],
+            "destinations": ["B", "D", "E"],
+            "costs": [[2.0, 5.0, 11.0], [0.0, 3.0, 9.0], [None, 0.0, 6.0]],
+        }
+
+        response = self.app.post("/routes/calculate-cost/matrix", json=data)
+        result = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Length", response.headers)
+        self.assertEqual(result, expected)
+
+    def test_calculate_cost_matrix_in_parallel(self):
+        with parallel_searches():
+            self.test_calculate_cost_matrix()
+
+    def test_calculate_cost_matrix_with_snapshot_engine(self):
+        with snapshot_engine():
+            self.test_calculate_cost_matrix()
+
+    def test_calculate_cost_matrix_with_nonexistent_origin_point(self):
+        data = {
+            "origins": ["A", "Y"],
+            "destinations": ["D"],
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+
+        response = self.app.post("/routes/calculate-cost/matrix", json=data)
+        expected = "Origin point 'Y' not found"
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+    def test_calculate_cost_matrix_with_invalid_data(self):
+        data = {
+            "origins": ["A"],
+            "destinations": ["D"],
+            "autonomy": "ABC",
+            "fuel_price": 2.0,
+        }
+
+        response = self.app.post("/routes/calculate-cost/matrix", json=data)
+        expected = "Value 'ABC' for field 'autonomy' is not a valid integer."
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+
+class JobQueueTestCase(unittest.TestCase):
+    def test_run_inline_without_workers(self):
+        ran = []
+        queue = JobQueue(ran.append)
+        queue.submit(1)
+
+        self.assertEqual(ran, [1])
+
+    def test_run_on_workers(self):
+        ran = []
+        queue = JobQueue(ran.append, workers=2)
+        for pk in range(10):
+            queue.submit(pk)
+        queue.shutdown()
+
+        self.assertEqual(sorted(ran), list(range(10)))
+
+    def test_recover_once(self):
+        ran = []
+        queue = JobQueue(ran.append, recover=lambda: [7, 8])
+        queue.submit(1)
+        queue.start()
+        queue.submit(2)
+
+        self.assertEqual(ran, [7, 8, 1, 2])
+
+
+class JobsApiTestCase(RouteFixtureTestCase):
+    def setUp(self):
+        super(JobsApiTestCase, self).setUp()
+        # jobs run inline, so they are done when submitted
+        self.workers = job_queue.workers
+        job_queue.workers = 0
+
+    def tearDown(self):
+        job_queue.workers = self.workers
+        super(JobsApiTestCase, self).tearDown()
+
+    def test_matrix_job(self):
+        params = {
+            "origins": ["A", "B", "D"],
+            "destinations": ["B", "D", "E"],
+            "autonomy": 10,
+            "fuel_price": 2.0,
+        }
+
+        response = self.app.post("/jobs", json={"kind": "matrix", "params": params})
+        job = response.get_json()["job"]
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers["Location"], job["uri"])
+        self.assertEqual(job["kind"], "matrix")
+        self.assertEqual(job["status"], "done")
+
+        response = self.app.get(job["uri"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"job": job})
+
+        response = self.app.get(job["result"])
+        expected = self.app.post("/routes/calculate-cost/matrix", json=params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, expected.data)
+
+    def test_cost_job_on_workers(self):
+        job_queue.workers = 1
+        params = {
+            "origin_point": "A",
+            "destination_point": "E",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+            "k": 2,
+        }
+
+        response = self.app.post("/jobs", json={"kind": "cost", "params": params})
+        job = response.get_json()["job"]
+        job_queue.shutdown()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(job["status"], ("pending", "running", "done"))
+
+        response = self.app.get(job["uri"])
+
+        self.assertEqual(response.get_json()["job"]["status"], "done")
+
+        response = self.app.get(job["result"])
+        expected = {
+            "paths": [
+                {"cost": 13.75, "path": "A B D E"},
+                {"cost": 15.0, "path": "A B E"},
+            ]
+        }
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), expected)
+
+    def test_failed_job(self):
+        params = {"origins": ["A", "Y"], "destinations": ["D"]}
+        params.update(autonomy=10, fuel_price=2.0)
+
+        response = self.app.post("/jobs", json={"kind": "matrix", "params": params})
+        job = response.get_json()["job"]
+
+        self.assertEqual(job["status"], "failed")
+
+        response = self.app.get(job["result"])
+        expected = "Origin point 'Y' not found"
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+    @clean_db
+    def test_unfinished_job_result(self):
+        job = Job(kind="cost", params="{}", status="running")
+        db.session.add(job)
+        db.session.commit()
+
+        response = self.app.get("/jobs/%d/result" % job.pk)
+        expected = "Job %d is still running" % job.pk
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(expected, result)
+
+    def test_recover_jobs(self):
+        params = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+        with app.app_context():
+            jobs = [
+                Job(kind="cost", params=json.dumps(params)),
+                Job(kind="cost", params="{}", status="running", updated_at=long_ago),
+                Job(kind="cost", params="{}", status="running"),
+            ]
+            db.session.add_all(jobs)
+            db.session.commit()
+            pks = [job.pk for job in jobs]
+
+        # a fresh process, whose queue has not started yet
+        queue = JobQueue(run_job, recover=recover_jobs)
+        queue.start()
+        # queued twice, the job still runs once
+        run_job(pks[0])
+
+        with app.app_context():
+            pending, lost, running = [Job.query.get(pk) for pk in pks]
+
+            self.assertEqual(pending.status, "done")
+            self.assertEqual(
+                json.loads(pending.result), {"cost": 6.25, "path": "A B D"}
+            )
+            self.assertEqual((lost.status, lost.status_code), ("failed", 500))
+            self.assertEqual(json.loads(lost.result), {"error": "Job was interrupted."})
+            self.assertEqual(running.status, "running")
+
+    def test_job_with_invalid_params(self):
+        params = {"origin_point": "A", "destination_point": "D", "autonomy": "x"}
+
+        response = self.app.post("/jobs", json={"kind": "cost", "params": params})
+        job = response.get_json()["job"]
+        response = self.app.get(job["result"])
+        expected = self.app.post("/routes/calculate-cost", json=params)
+
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), expected.get_json())
+
+    def test_job_skips_the_request_hooks(self):
+        params = {
+            "origin_point": "A",
+            "destination_point": "D",
+            "autonomy": 10,
+            "fuel_price": 2.5,
+        }
+        metrics.enabled = True
+        metrics.clear()
+        try:
+            self.app.post("/jobs", json={"kind": "cost", "params": params})
+            text = metrics.render()
+        finally:
+            metrics.enabled = False
+            metrics.clear()
+
+        self.assertIn('routes_api_request_seconds_count{endpoint="jobs"} 1', text)
+        self.assertNotIn('endpoint="route_calculate_cost"', text)
+        self.assertIn('routes_api_searches_total{engine="dijkstra"} 1', text)
+
+    def test_nonexistent_job(self):
+        for uri in ("/jobs/42", "/jobs/42/result"):
+            response = self.app.get(uri)
+            expected = "Job not found"
+            result = response.data.decode("utf-8")
+
+            self.assertEqual(response.status_code, 404)
+            self.assertIn(expected, result)
+
+    def test_submit_job_with_invalid_kind(self):
+        response = self.app.post("/jobs", json={"kind": "route", "params": {}})
+        expected = "Value 'route' for field 'kind' is not one of: batch, cost, matrix."
+        result = response.data.decode("utf-8")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(expected, result)
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.previous = {
+            name: app.config[name] for name in ("ALL_PAIRS_MAX_NODES", "ROUTING_ENGINE")
+        }
+        self.maxsize = path_cache.maxsize
+
+    def tearDown(self):
+        app.config.update(self.previous)
+        path_cache.maxsize = self.maxsize
+        path_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        routing_graph.invalidate()
+
+    def test_random_pairs(self):
+        for seed in range(4):
+            edges, _ = grid_network(30, seed=seed)
+            graph = build_graph(edges)
+            for origin, destination in random_pairs(graph, 50, seed):
+                self.assertNotEqual(origin, destination)
+                self.assertIn(destination, heap_dijkstra(graph, origin)[0])
+
+    def test_small_runs(self):
+        for seed in range(4):
+            args = argparse.Namespace(
+                networks=sorted(NETWORKS),
+                sizes=[30, 200],
+                queries=20,
+                engine="dijkstra",
+                seed=seed,
+            )
+            with contextlib.redirect_stderr(io.StringIO()):
+                results = run_suite(args)
+
+            self.assertEqual(len(results), len(NETWORKS) * 2)
+            for result in results:
+                self.assertEqual(result["requests"]["queries"], 20)
+
 
 if __name__ == "__main__":
     unittest.main()